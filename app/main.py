@@ -1,27 +1,101 @@
 import sys
 import os
+import asyncio
 import threading
 import json
-import uvicorn
-from fastapi import FastAPI, Request
+import html
+import io
+import csv
+import uuid
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from urllib.parse import urlencode, quote
 
 # Fix: Add the project root to sys.path *BEFORE* absolute imports from app
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
+# Startup phases are timed from here (see /admin/stats -> startup)
+from app.utils import startup
+
+with startup.phase("import:web"):
+    import uvicorn
+    from fastapi import FastAPI, Request, Form
+    from fastapi.responses import HTMLResponse, StreamingResponse
+    from fastapi.staticfiles import StaticFiles
+
 # Carrega variáveis de ambiente do arquivo .env
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
-from app.services.whatsapp_service import start_whatsapp, send_whatsapp_message
-from app.utils.script_runner import run_script
-from fastapi.staticfiles import StaticFiles
-from app.scripts.generate_charts import generate_charts
+# Heavy modules (neonize, openai, matplotlib) are NOT imported here: they are loaded
+# lazily by the code that needs them, or preloaded in the background after startup.
+with startup.phase("import:app_services"):
+    from app.utils import script_runner
+    from app.utils.script_runner import run_script
+    from app.services import database, job_queue
+
+# === BACKGROUND JOBS (side effects of /cadastro) ===
+
+def job_save_to_excel(payload):
+    # The key makes a retry after a partial success (row journaled, result lost) a no-op
+    args = [json.dumps(payload["data"])]
+    if payload.get("key"):
+        args.append(payload["key"])
+    output = run_script("save_to_excel", args)
+    print(f"📊 [JOBS] save_to_excel: {output}")
+    return output.startswith("✅")
+
+def job_send_whatsapp(payload):
+    from app.services.whatsapp_service import send_whatsapp_message
+    return send_whatsapp_message(payload["telefone"], payload["text"])
+
+def job_send_email(payload):
+    # Returns the send queue's Future: the job worker does not wait, so emails queued by
+    # many jobs go out together in one batch
+    from app.services.email_service import queue_registration_email
+    return queue_registration_email(payload["email"], payload["data"])
+
+job_queue.register("save_to_excel", job_save_to_excel)
+job_queue.register("send_whatsapp", job_send_whatsapp)
+job_queue.register("send_email", job_send_email)
+
+def preload_heavy_modules():
+    """Imports the slow modules ahead of their first use, without delaying startup."""
+    with startup.phase("preload:openai"):
+        import openai  # noqa: F401 (the client itself is built on first use)
+    with startup.phase("preload:matplotlib"):
+        import app.scripts.generate_charts  # noqa: F401 (pulls in matplotlib.pyplot)
+
+@asynccontextmanager
+async def lifespan(app):
+    from app.services import excel_service, async_database
 
-app = FastAPI(title="Shopfono AI Bot Webhook")
+    with startup.phase("database.init_db"):
+        await asyncio.to_thread(database.init_db)
+    with startup.phase("job_queue.start"):
+        await asyncio.to_thread(job_queue.start)
+    with startup.phase("excel_service.start_background_roll"):
+        # Rows journaled by save_to_excel reach vendas.xlsx within EXCEL_ROLL_INTERVAL
+        excel_service.sink.start_background_roll()
+    with startup.phase("script_runner.warm_up"):
+        # Start the pre-warmed script workers (they import their modules in the background)
+        await asyncio.to_thread(script_runner.warm_up)
+    startup.run_in_background("preload", preload_heavy_modules)
+    startup.mark_ready()
+
+    yield
+
+    await asyncio.to_thread(job_queue.stop)
+    script_runner.shutdown()
+    from app.services import image_service
+    image_service.shutdown()
+    await async_database.close_pool()
+    database.close_pool()
+
+app = FastAPI(title="Shopfono AI Bot Webhook", lifespan=lifespan)
 
 # Mount charts directory to serve static files
 charts_path = os.path.join(project_root, "app", "charts")
@@ -33,6 +107,42 @@ app.mount("/charts", StaticFiles(directory=charts_path), name="charts")
 def home():
     return {"status": "online", "service": "Shopfono AI Bot", "version": "1.5.3 - Admin Acessos"}
 
+@app.get("/admin/stats")
+def view_stats():
+    """Admin endpoint with internal runtime counters (JSON)."""
+    from app.services import async_database, chart_service, image_service
+    from app.services.openai_service import get_openai_stats
+    from app.utils.audio import get_audio_stats
+    from app.utils.image_prep import get_image_stats
+    from app.services.email_service import get_email_stats
+    from app.utils.jid import get_jid_cache_stats
+    from app.services.whatsapp_service import get_dispatcher_stats, get_conversation_stats, get_answer_cache_stats, get_outbox_stats
+    return {
+        "startup": startup.report(),
+        "db_pool": database.get_pool_stats(),
+        "user_cache": database.get_user_cache_stats(),
+        "last_interaction_buffer": database.get_last_interaction_stats(),
+        "jobs": job_queue.get_job_stats(limit=0)["counts"],
+        "whatsapp_dispatcher": get_dispatcher_stats(),
+        "whatsapp_outbox": get_outbox_stats(),
+        "conversation_memory": get_conversation_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "openai": get_openai_stats(),
+        "audio": get_audio_stats(),
+        "images": get_image_stats(),
+        "image_generation": image_service.get_image_generation_stats(),
+        "email": get_email_stats(),
+        "jid_cache": get_jid_cache_stats(),
+        "script_pool": script_runner.get_script_pool_stats(),
+        "charts": chart_service.get_chart_stats(),
+        "async_db_pool": async_database.get_pool_stats(),
+    }
+
+@app.get("/admin/jobs")
+def view_jobs():
+    """Admin endpoint listing pending, running and failed background jobs (JSON)."""
+    return job_queue.get_job_stats()
+
 @app.get("/cadastro", response_class=HTMLResponse)
 async def get_form():
     template_path = os.path.join(project_root, "app", "templates", "form.html")
@@ -79,12 +189,14 @@ async def post_form(
     
     # Salva no PostgreSQL
     print(f"💾 Salvando cadastro no banco de dados...")
-    from app.services import database
-    registration_id = database.create_registration(data)
+    from app.services import async_database
+    registration_id = await async_database.create_registration(data)
     
     if not registration_id:
         print("⚠️ Falha ao salvar no banco de dados, mas continuando com email...")
     
+    # Efeitos colaterais (Excel, WhatsApp, e-mail) rodam em segundo plano com retry
+    
     # Prepara os dados para o Excel (mantido para compatibilidade)
     data_excel = {
         "Pessoa": pessoa,
@@ -102,24 +214,22 @@ async def post_form(
         "Cidade": cidade,
         "UF": uf
     }
-    data_str = json.dumps(data_excel)
-    run_script("save_to_excel", [data_str])
+    await job_queue.enqueue_async("save_to_excel", {"data": data_excel, "key": uuid.uuid4().hex})
     
     # Notifica o cliente via WhatsApp se possível
     msg = f"Olá {nome}! Recebemos seu cadastro com sucesso. 📝✅\n\nNossa equipe em breve entrará em contato. Obrigado!"
-    print(f"📞 Iniciando notificação WhatsApp para {telefone}...")
-    send_whatsapp_message(telefone, msg)
+    print(f"📞 Agendando notificação WhatsApp para {telefone}...")
+    await job_queue.enqueue_async("send_whatsapp", {"telefone": telefone, "text": msg})
     
     # Envia o e-mail de confirmação
-    print(f"✉️ Iniciando envio de e-mail para {email}...")
-    from app.services.email_service import send_registration_email
-    send_registration_email(email, data_excel)
+    print(f"✉️ Agendando envio de e-mail para {email}...")
+    await job_queue.enqueue_async("send_email", {"email": email, "data": data_excel})
     print("✨ Processo de cadastro finalizado.")
     
     return HTMLResponse(content=f"""
         <div style="font-family: sans-serif; text-align: center; padding: 50px;">
             <h1 style="color: #6366f1;">Obrigado, {nome}!</h1>
-            <p>Seus dados foram enviados com sucesso e uma confirmação foi enviada para {email}.</p>
+            <p>Seus dados foram enviados com sucesso e uma confirmação será enviada para {email}.</p>
             <a href="/cadastro" style="color: #6366f1; text-decoration: none; font-weight: bold;">Voltar</a>
         </div>
     """, status_code=200)
@@ -159,44 +269,84 @@ async def get_qr_code():
     
     return HTMLResponse(content=content, status_code=200)
 
+# === ADMIN LISTING HELPERS ===
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+
+def _cell(value):
+    """Escaped table cell content ('-' for empty values)."""
+    return html.escape(str(value)) if value not in (None, "") else "-"
+
+def _fmt_dt(value):
+    return value.strftime('%d/%m/%Y %H:%M') if value else '-'
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def _pager_html(path, filters, cursor, next_cursor):
+    """'First page' / 'Next page' links keeping the active filters."""
+    active = {k: v for k, v in filters.items() if v}
+    links = []
+    if cursor:
+        links.append(f'<a href="{path}?{html.escape(urlencode(active))}">⏮ Primeira página</a>')
+    if next_cursor:
+        links.append(f'<a href="{path}?{html.escape(urlencode({**active, "cursor": next_cursor}))}">Próxima página →</a>')
+    return f'<div class="pager">{" ".join(links)}</div>' if links else ""
+
 @app.get("/admin/registrations", response_class=HTMLResponse)
-async def view_registrations():
-    """Admin endpoint to view all registrations from PostgreSQL."""
-    from app.services import database
-    
-    registrations = database.get_all_registrations()
+async def view_registrations(
+    cursor: str = None,
+    cidade: str = None,
+    estado: str = None,
+    data_de: str = None,
+    data_ate: str = None,
+    nome: str = None,
+    limit: int = ADMIN_PAGE_SIZE
+):
+    """Admin endpoint to browse registrations from PostgreSQL (keyset paginated, with filters)."""
+    from app.services import async_database
     
-    # Generate charts removed from here, moving to dedicated page
-    # from app.scripts.generate_charts import generate_charts
-    # try:
-    #     generate_charts()
-    # except Exception as e:
-    #     print(f"Error refreshing charts: {e}")
+    limit = max(1, min(limit, 500))
+    registrations, next_cursor = await async_database.get_registrations_page(
+        limit=limit,
+        cursor=cursor,
+        cidade=cidade,
+        estado=estado,
+        date_from=_parse_date(data_de),
+        date_to=_parse_date(data_ate),
+        nome_prefix=nome,
+    )
+    total = await async_database.estimate_count("registrations")
     
     # Build HTML table
-    rows_html = ""
-    for reg in registrations:
-        rows_html += f"""
-        <tr>
-            <td>{reg['id']}</td>
-            <td>{reg['nome']}</td>
-            <td>{reg['email']}</td>
-            <td>{reg['telefone']}</td>
-            <td>{reg['whatsapp'] or '-'}</td>
-            <td>{reg['cep'] or '-'}</td>
-            <td>{reg['endereco'] or '-'}</td>
-            <td>{reg['numero'] or '-'}</td>
-            <td>{reg['complemento'] or '-'}</td>
-            <td>{reg['bairro'] or '-'}</td>
-            <td>{reg['cidade'] or '-'}</td>
-            <td>{reg['estado'] or '-'}</td>
-            <td>{reg['genero'] or '-'}</td>
-            <td>{reg['cpf_cnpj'] or '-'}</td>
-            <td>{reg['created_at'].strftime('%d/%m/%Y %H:%M') if reg['created_at'] else '-'}</td>
-        </tr>
-        """
+    rows_html = "".join(
+        "<tr>" + "".join(f"<td>{_cell(value)}</td>" for value in (
+            reg['id'], reg['nome'], reg['email'], reg['telefone'], reg['whatsapp'], reg['cep'],
+            reg['endereco'], reg['numero'], reg['complemento'], reg['bairro'], reg['cidade'],
+            reg['estado'], reg['genero'], reg['cpf_cnpj'],
+        )) + f"<td>{_fmt_dt(reg['created_at'])}</td></tr>"
+        for reg in registrations
+    )
     
-    total = len(registrations)
+    filters = {"cidade": cidade, "estado": estado, "data_de": data_de, "data_ate": data_ate, "nome": nome, "limit": limit if limit != ADMIN_PAGE_SIZE else None}
+    export_filters = {k: v for k, v in filters.items() if v and k != "limit"}
+    filters_html = f"""
+            <form class="filters" method="get" action="/admin/registrations">
+                <input name="nome" placeholder="Nome começa com..." value="{html.escape(nome or '')}">
+                <input name="cidade" placeholder="Cidade" value="{html.escape(cidade or '')}">
+                <input name="estado" placeholder="UF" maxlength="2" size="3" value="{html.escape(estado or '')}">
+                <label>De <input type="date" name="data_de" value="{html.escape(data_de or '')}"></label>
+                <label>Até <input type="date" name="data_ate" value="{html.escape(data_ate or '')}"></label>
+                <button type="submit">Filtrar</button>
+                <a href="/admin/registrations">Limpar</a>
+                <a href="/admin/registrations/export?{html.escape(urlencode(export_filters))}">⬇ CSV</a>
+                <a href="/admin/registrations/export?{html.escape(urlencode({**export_filters, "formato": "xlsx"}))}">⬇ XLSX</a>
+            </form>
+    """
+    pager_html = _pager_html("/admin/registrations", filters, cursor, next_cursor)
     
     return HTMLResponse(content=f"""
     <!DOCTYPE html>
@@ -293,6 +443,36 @@ async def view_registrations():
                 color: #6b7280;
                 font-size: 0.9rem;
             }}
+            .filters {{
+                display: flex;
+                flex-wrap: wrap;
+                gap: 10px;
+                align-items: center;
+                padding: 20px 20px 0;
+            }}
+            .filters input {{
+                padding: 8px;
+                border: 1px solid #d1d5db;
+                border-radius: 6px;
+            }}
+            .filters button {{
+                background: #6366f1;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 6px;
+                cursor: pointer;
+            }}
+            .pager {{
+                display: flex;
+                justify-content: space-between;
+                padding: 0 20px 20px;
+            }}
+            .filters a, .pager a {{
+                color: #6366f1;
+                text-decoration: none;
+                font-weight: 600;
+            }}
         </style>
     </head>
     <body>
@@ -300,13 +480,15 @@ async def view_registrations():
             <div class="header">
                 <h1>📋 Cadastros Registrados</h1>
                 <div class="stats">
-                    Total de cadastros: <span>{total}</span>
+                    Total de cadastros{' (sem filtros)' if export_filters else ''}: <span>{total if total is not None else '-'}</span>
                 </div>
             </div>
             
-
+            {filters_html}
+            
+            {"<div class='table-container'><table><thead><tr><th>ID</th><th>Nome</th><th>Email</th><th>Telefone</th><th>WhatsApp</th><th>CEP</th><th>Endereço</th><th>Número</th><th>Complemento</th><th>Bairro</th><th>Cidade</th><th>Estado</th><th>Gênero</th><th>CPF/CNPJ</th><th>Data Cadastro</th></tr></thead><tbody>" + rows_html + "</tbody></table></div>" if registrations else "<div class='empty'><h2>Nenhum cadastro encontrado</h2><p>Os cadastros aparecerão aqui assim que forem enviados pelo formulário.</p></div>"}
             
-            {"<div class='table-container'><table><thead><tr><th>ID</th><th>Nome</th><th>Email</th><th>Telefone</th><th>WhatsApp</th><th>CEP</th><th>Endereço</th><th>Número</th><th>Complemento</th><th>Bairro</th><th>Cidade</th><th>Estado</th><th>Gênero</th><th>CPF/CNPJ</th><th>Data Cadastro</th></tr></thead><tbody>" + rows_html + "</tbody></table></div>" if total > 0 else "<div class='empty'><h2>Nenhum cadastro encontrado</h2><p>Os cadastros aparecerão aqui assim que forem enviados pelo formulário.</p></div>"}
+            {pager_html}
             
             <div class="footer">
                 Shopfono AI Bot v1.5.3 - Admin Panel
@@ -316,6 +498,87 @@ async def view_registrations():
     </html>
     """, status_code=200)
 
+EXPORT_COLUMNS = [
+    ("id", "ID"), ("nome", "Nome"), ("email", "Email"), ("telefone", "Telefone"), ("whatsapp", "WhatsApp"),
+    ("cep", "CEP"), ("endereco", "Endereço"), ("numero", "Número"), ("complemento", "Complemento"),
+    ("bairro", "Bairro"), ("cidade", "Cidade"), ("estado", "Estado"), ("genero", "Gênero"),
+    ("cpf_cnpj", "CPF/CNPJ"), ("created_at", "Data Cadastro"),
+]
+
+async def _export_csv(batches):
+    # BOM + ';' so Excel (pt-BR) opens the file with the right encoding and columns
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow([label for _, label in EXPORT_COLUMNS])
+    yield "\ufeff" + buffer.getvalue()
+
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow([
+                _fmt_dt(row[key]) if key == "created_at" else (row[key] if row[key] is not None else "")
+                for key, _ in EXPORT_COLUMNS
+            ])
+        yield buffer.getvalue()
+
+async def _export_xlsx(batches):
+    # openpyxl write-only mode streams each row to a temp file instead of keeping the sheet in memory
+    from openpyxl import Workbook
+
+    def append_rows(sheet, rows):
+        for row in rows:
+            sheet.append([row[key] for key, _ in EXPORT_COLUMNS])
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Cadastros")
+    sheet.append([label for _, label in EXPORT_COLUMNS])
+    # Each cursor batch is serialized in a worker thread, keeping the event loop free
+    async for rows in batches:
+        await asyncio.to_thread(append_rows, sheet, rows)
+
+    with tempfile.TemporaryFile() as output:
+        await asyncio.to_thread(workbook.save, output)
+        output.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(output.read, 64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+@app.get("/admin/registrations/export")
+async def export_registrations(
+    formato: str = "csv",
+    cidade: str = None,
+    estado: str = None,
+    data_de: str = None,
+    data_ate: str = None,
+    nome: str = None
+):
+    """Streams the (filtered) registrations as CSV or XLSX using a server-side cursor."""
+    from app.services import async_database
+    
+    batches = async_database.stream_registrations(
+        cidade=cidade,
+        estado=estado,
+        date_from=_parse_date(data_de),
+        date_to=_parse_date(data_ate),
+        nome_prefix=nome,
+    )
+    filename = f"cadastros_{datetime.now().strftime('%Y%m%d_%H%M')}"
+    
+    if formato == "xlsx":
+        return StreamingResponse(
+            _export_xlsx(batches),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.xlsx"'},
+        )
+    return StreamingResponse(
+        _export_csv(batches),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+    )
+
 @app.get("/admin/registration", response_class=HTMLResponse)
 async def view_registration_alias():
     """Alias for /admin/registrations (singular)."""
@@ -323,26 +586,30 @@ async def view_registration_alias():
     return RedirectResponse(url="/admin/registrations")
 
 @app.get("/admin/users", response_class=HTMLResponse)
-async def view_users():
-    """Admin endpoint to view all WhatsApp users from PostgreSQL."""
-    from app.services import database
+async def view_users(cursor: str = None, nome: str = None, limit: int = ADMIN_PAGE_SIZE):
+    """Admin endpoint to browse WhatsApp users from PostgreSQL (keyset paginated)."""
+    from app.services import async_database
     
-    users = database.get_all_users()
+    limit = max(1, min(limit, 500))
+    users, next_cursor = await async_database.get_users_page(limit=limit, cursor=cursor, name_prefix=nome)
+    total = await async_database.estimate_count("users")
     
     # Build HTML table
-    rows_html = ""
-    for user in users:
-        rows_html += f"""
-        <tr>
-            <td>{user['id']}</td>
-            <td>{user['phone']}</td>
-            <td>{user['name']}</td>
-            <td>{user['created_at'].strftime('%d/%m/%Y %H:%M') if user['created_at'] else '-'}</td>
-            <td>{user['last_interaction'].strftime('%d/%m/%Y %H:%M') if user['last_interaction'] else '-'}</td>
-        </tr>
-        """
+    rows_html = "".join(
+        f"<tr><td>{_cell(user['id'])}</td><td>{_cell(user['phone'])}</td><td>{_cell(user['name'])}</td>"
+        f"<td>{_fmt_dt(user['created_at'])}</td><td>{_fmt_dt(user['last_interaction'])}</td></tr>"
+        for user in users
+    )
     
-    total = len(users)
+    filters = {"nome": nome, "limit": limit if limit != ADMIN_PAGE_SIZE else None}
+    filters_html = f"""
+            <form class="filters" method="get" action="/admin/users">
+                <input name="nome" placeholder="Nome começa com..." value="{html.escape(nome or '')}">
+                <button type="submit">Filtrar</button>
+                <a href="/admin/users">Limpar</a>
+            </form>
+    """
+    pager_html = _pager_html("/admin/users", filters, cursor, next_cursor)
     
     return HTMLResponse(content=f"""
     <!DOCTYPE html>
@@ -433,6 +700,35 @@ async def view_users():
                 font-weight: 600;
                 font-size: 0.9rem;
             }}
+            .filters {{
+                display: flex;
+                gap: 10px;
+                align-items: center;
+                padding: 20px 20px 0;
+            }}
+            .filters input {{
+                padding: 8px;
+                border: 1px solid #d1d5db;
+                border-radius: 6px;
+            }}
+            .filters button {{
+                background: #3b82f6;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 6px;
+                cursor: pointer;
+            }}
+            .pager {{
+                display: flex;
+                justify-content: space-between;
+                padding: 0 20px 20px;
+            }}
+            .filters a, .pager a {{
+                color: #3b82f6;
+                text-decoration: none;
+                font-weight: 600;
+            }}
         </style>
     </head>
     <body>
@@ -444,11 +740,15 @@ async def view_users():
             <div class="header">
                 <h1>📱 Acessos WhatsApp</h1>
                 <div class="stats">
-                    Total de usuários: <span>{total}</span>
+                    Total de usuários{' (sem filtros)' if nome else ''}: <span>{total if total is not None else '-'}</span>
                 </div>
             </div>
             
-            {"<div class='table-container'><table><thead><tr><th>ID</th><th>Telefone</th><th>Nome</th><th>Primeiro Acesso</th><th>Última Interação</th></tr></thead><tbody>" + rows_html + "</tbody></table></div>" if total > 0 else "<div class='empty'><h2>Nenhum acesso encontrado</h2></div>"}
+            {filters_html}
+            
+            {"<div class='table-container'><table><thead><tr><th>ID</th><th>Telefone</th><th>Nome</th><th>Primeiro Acesso</th><th>Última Interação</th></tr></thead><tbody>" + rows_html + "</tbody></table></div>" if users else "<div class='empty'><h2>Nenhum acesso encontrado</h2></div>"}
+            
+            {pager_html}
             
             <div class="footer">
                 Shopfono AI Bot v1.5.3 - Admin Panel
@@ -462,6 +762,8 @@ async def view_users():
 
 def run_bot():
     try:
+        with startup.phase("import:whatsapp_service"):
+            from app.services.whatsapp_service import start_whatsapp
         start_whatsapp()
     except Exception as e:
         print(f"Fatal Error in WhatsApp Client: {e}")
@@ -469,12 +771,12 @@ def run_bot():
 @app.get("/admin/charts", response_class=HTMLResponse)
 async def view_charts():
     """Admin endpoint to view analytics charts."""
+    from app.services import chart_service
     
-    # Generate charts on page load
-    try:
-        generate_charts()
-    except Exception as e:
-        print(f"Error refreshing charts: {e}")
+    # Charts are re-rendered in the background only when the data changed;
+    # the PNGs are served by /charts with ETag/Last-Modified (304 when unchanged)
+    chart_service.refresh_in_background()
+    version = quote(chart_service.get_chart_version())
     
     return HTMLResponse(content=f"""
     <!DOCTYPE html>
@@ -577,11 +879,11 @@ async def view_charts():
             <div class="charts-container">
                 <div class="chart-card">
                     <h3>Distribuição de Usuários</h3>
-                    <img src="/charts/grafico_pizza_usuarios.png" alt="Gráfico de Pizza">
+                    <img src="/charts/grafico_pizza_usuarios.png?v={version}" alt="Gráfico de Pizza">
                 </div>
                 <div class="chart-card">
                     <h3>Top Nomes em Cadastros</h3>
-                    <img src="/charts/grafico_barra_cadastros.png" alt="Gráfico de Barra">
+                    <img src="/charts/grafico_barra_cadastros.png?v={version}" alt="Gráfico de Barra">
                 </div>
             </div>
             
@@ -1,34 +1,32 @@
 import os
-import psycopg2
-import pandas as pd
+import sys
 import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 
+# Allow "from app..." imports when executed as a standalone script
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.services import analytics
+
 # Load environment variables
 load_dotenv()
 
-# Get database connection
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-if not DATABASE_URL:
-    print("❌ Error: DATABASE_URL not set in environment.")
-    # Don't exit here if imported, just return
-else:
-    pass
+PIE_TOP = int(os.getenv("CHART_PIE_TOP", "10"))
+BAR_TOP = 10
 
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
-    except Exception as e:
-        print(f"❌ Error connecting to database: {e}")
-        return None
+def _save_figure(output_path):
+    # Render to a temp file and rename, so the web server never serves a half-written PNG
+    tmp_path = f"{output_path}.tmp.png"
+    plt.savefig(tmp_path)
+    os.replace(tmp_path, output_path)
 
 def generate_charts():
-    conn = get_db_connection()
-    if not conn:
-        print("❌ Could not connect to database for chart generation.")
-        return
+    """Renders the admin charts. Returns True if they were generated, False on error."""
+    if not os.getenv("DATABASE_URL"):
+        print("❌ Error: DATABASE_URL not set in environment.")
+        return False
 
     try:
         # Determine charts directory absolute path
@@ -36,28 +34,32 @@ def generate_charts():
         current_dir = os.path.dirname(os.path.abspath(__file__))
         # go up one level to 'app' then 'charts'
         # script is in app/scripts/, so up one level is app/
-        app_dir = os.path.dirname(current_dir) 
+        app_dir = os.path.dirname(current_dir)
         charts_dir = os.path.join(app_dir, "charts")
-        
+
         if not os.path.exists(charts_dir):
             os.makedirs(charts_dir)
 
         # --- 1. Pie Chart: User Distribution ---
-        
+
         print("📊 Generating User Pie Chart...")
-        query_users = "SELECT name, phone FROM users"
-        df_users = pd.read_sql_query(query_users, conn)
+        user_counts = analytics.top_values("users", "name", limit=PIE_TOP)
+
+        if user_counts["rows"]:
+            labels = [name for name, _ in user_counts["rows"]]
+            sizes = [count for _, count in user_counts["rows"]]
+            others = user_counts["total"] - sum(sizes)
+            if others > 0:
+                labels.append("Outros")
+                sizes.append(others)
 
-        if not df_users.empty:
-            user_counts = df_users['name'].value_counts()
-            
             plt.figure(figsize=(10, 8))
-            plt.pie(user_counts, labels=user_counts.index, autopct='%1.1f%%', startangle=140)
+            plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
             plt.title('Participação de Chamadas por Usuário (Simulado: Distribuição de Usuários)')
             plt.axis('equal')
-            
+
             output_path_pie = os.path.join(charts_dir, "grafico_pizza_usuarios.png")
-            plt.savefig(output_path_pie)
+            _save_figure(output_path_pie)
             print(f"✅ User Pie Chart saved to {output_path_pie}")
             plt.close()
         else:
@@ -65,31 +67,33 @@ def generate_charts():
 
         # --- 2. Bar Chart: Registration Names ---
         print("📊 Generating Registration Bar Chart...")
-        query_registrations = "SELECT nome FROM registrations"
-        df_registrations = pd.read_sql_query(query_registrations, conn)
+        name_counts = analytics.top_values("registrations", "nome", limit=BAR_TOP) # Top 10 names
+
+        if name_counts["rows"]:
+            names = [name for name, _ in name_counts["rows"]]
+            counts = [count for _, count in name_counts["rows"]]
 
-        if not df_registrations.empty:
-            name_counts = df_registrations['nome'].value_counts().head(10) # Top 10 names
-            
             plt.figure(figsize=(12, 6))
-            name_counts.plot(kind='bar', color='skyblue')
+            plt.bar(names, counts, color='skyblue')
             plt.title('Participação por Nome (Top 10 Cadastros)')
             plt.xlabel('Nome')
             plt.ylabel('Quantidade')
             plt.xticks(rotation=45, ha='right')
             plt.tight_layout()
-            
+
             output_path_bar = os.path.join(charts_dir, "grafico_barra_cadastros.png")
-            plt.savefig(output_path_bar)
+            _save_figure(output_path_bar)
             print(f"✅ Registration Bar Chart saved to {output_path_bar}")
             plt.close()
         else:
             print("⚠️ No data found in 'registrations' table.")
 
+        return True
     except Exception as e:
         print(f"❌ Error generating charts: {e}")
+        return False
     finally:
-        conn.close()
+        plt.close('all')
 
 if __name__ == "__main__":
     generate_charts()
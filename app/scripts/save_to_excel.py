@@ -1,10 +1,14 @@
-import pandas as pd
 import os
 import sys
 import json
 from datetime import datetime
 
-EXCEL_FILE = "vendas.xlsx"
+# Allow "from app..." imports when executed as a standalone script
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.services.excel_service import EXCEL_FILE, sink
 
 def main():
     if len(sys.argv) < 2:
@@ -15,21 +19,18 @@ def main():
         # Recebe os dados como uma string JSON (mais seguro para dados complexos)
         raw_data = sys.argv[1]
         data = json.loads(raw_data)
-        
+
         # Adiciona timestamp
         data['Data_Processamento'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        
-        df_new = pd.DataFrame([data])
-        
-        if os.path.exists(EXCEL_FILE):
-            df_existing = pd.read_excel(EXCEL_FILE)
-            df_final = pd.concat([df_existing, df_new], ignore_index=True)
-            df_final.to_excel(EXCEL_FILE, index=False)
-        else:
-            df_new.to_excel(EXCEL_FILE, index=False)
-            
+
+        # Chave opcional do job: uma nova tentativa do mesmo cadastro não duplica a linha
+        key = sys.argv[2] if len(sys.argv) > 2 else None
+
+        # Só acrescenta a linha ao journal; o arquivo é consolidado em lotes
+        sink.append(data, key=key)
+
         print(f"✅ Dados gravados com sucesso em {EXCEL_FILE}")
-        
+
     except Exception as e:
         print(f"❌ Erro ao processar Excel: {str(e)}")
 
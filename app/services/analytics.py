@@ -0,0 +1,58 @@
+from psycopg2 import sql
+from app.services import database
+
+# Aggregation queries for charts and reports. The grouping happens in PostgreSQL,
+# so only one row per distinct value (or period) travels back to Python.
+
+PERIODS = ("hour", "day", "week", "month", "year")
+
+def top_values(table, column, limit=10):
+    """
+    Most frequent values of table.column.
+    Returns {"rows": [(value, count), ...], "total": rows in table, "distinct": distinct values}.
+    """
+    query = sql.SQL("""
+        SELECT {column} AS value,
+               COUNT(*) AS total,
+               SUM(COUNT(*)) OVER () AS grand_total,
+               COUNT(*) OVER () AS distinct_values
+        FROM {table}
+        GROUP BY {column}
+        ORDER BY total DESC, value
+        LIMIT %s
+    """).format(table=sql.Identifier(table), column=sql.Identifier(column))
+
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, (limit,))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    if not rows:
+        return {"rows": [], "total": 0, "distinct": 0}
+    return {
+        "rows": [(row['value'], row['total']) for row in rows],
+        "total": int(rows[0]['grand_total']),
+        "distinct": rows[0]['distinct_values'],
+    }
+
+def count_by_period(table, period="day", column="created_at", limit=30):
+    """Row counts per period (most recent first): [(period_start, count), ...]."""
+    if period not in PERIODS:
+        raise ValueError(f"Invalid period: {period}")
+
+    query = sql.SQL("""
+        SELECT date_trunc(%s, {column}) AS period, COUNT(*) AS total
+        FROM {table}
+        WHERE {column} IS NOT NULL
+        GROUP BY period
+        ORDER BY period DESC
+        LIMIT %s
+    """).format(table=sql.Identifier(table), column=sql.Identifier(column))
+
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, (period, limit))
+        rows = cursor.fetchall()
+        cursor.close()
+    return [(row['period'], row['total']) for row in rows]
@@ -0,0 +1,182 @@
+import re
+import math
+import time
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+# Filler words ignored when comparing the words of two questions
+STOPWORDS = frozenset("""
+    a o as os um uma de do da dos das e em no na nos nas para pra por que qual quais
+    me vc vcs voce voces favor oi ola bom dia boa tarde noite
+""".split())
+
+def normalize(text):
+    """Lowercase, accents and punctuation removed, single spaces ("Qual o horário?" -> "qual o horario")."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _NON_WORD.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+def trigram_vector(normalized):
+    """Character trigram counts of each word (padded with spaces), robust to typos and word order."""
+    grams = Counter()
+    for word in normalized.split(" "):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams[padded[i:i + 3]] += 1
+    return grams
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(count * b.get(gram, 0) for gram, count in a.items())
+    if not dot:
+        return 0.0
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+def content_words(normalized):
+    return {word for word in normalized.split(" ") if word and word not in STOPWORDS}
+
+def _has_counterpart(word, words, min_similarity):
+    vector = trigram_vector(word)
+    return any(other == word or cosine(vector, trigram_vector(other)) >= min_similarity for other in words)
+
+def same_words(a, b, min_similarity=0.5):
+    """
+    True when every content word of each question appears in the other (allowing typos):
+    "horario de funcionamento" vs "horario de funcionamento no sabado" is False.
+    """
+    words_a, words_b = content_words(a), content_words(b)
+    return (all(_has_counterpart(word, words_b, min_similarity) for word in words_a)
+            and all(_has_counterpart(word, words_a, min_similarity) for word in words_b))
+
+class AnswerCache:
+    """
+    Local cache of GPT answers for repeated questions (FAQ: hours, payment, delivery...).
+
+    Lookup is an exact match on the normalized question first, then a cosine similarity
+    search over character-trigram vectors through an inverted index; a similar question
+    must also have the same content words (same_words), so an extra "no sábado" is never
+    answered with the generic answer. Entries expire after
+    ``ttl`` seconds and the whole cache is dropped when the system prompt version changes.
+    """
+
+    def __init__(self, threshold=0.9, ttl=86400.0, max_entries=2000, min_chars=12, max_candidates=30):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+        self.max_candidates = max_candidates
+
+        self._entries = OrderedDict()  # normalized question -> entry dict
+        self._index = {}  # trigram -> set of normalized questions
+        self._prompt_version = None
+        self._lock = threading.Lock()
+        self._avg_generation_seconds = None
+        self._stats = {
+            "lookups": 0, "exact_hits": 0, "similar_hits": 0, "misses": 0, "skipped": 0,
+            "stores": 0, "evictions": 0, "invalidations": 0, "seconds_saved": 0.0,
+        }
+
+    def _check_version(self, prompt_version):
+        if prompt_version != self._prompt_version:
+            if self._entries:
+                self._stats["invalidations"] += 1
+                print(f"🧹 [FAQ] System prompt changed, clearing {len(self._entries)} cached answer(s)")
+            self._entries.clear()
+            self._index.clear()
+            self._prompt_version = prompt_version
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for gram in entry["vector"]:
+            keys = self._index.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[gram]
+
+    def _record_hit(self, kind, entry):
+        self._stats[kind] += 1
+        entry["hits"] += 1
+        if self._avg_generation_seconds:
+            self._stats["seconds_saved"] += self._avg_generation_seconds
+
+    def lookup(self, question, prompt_version=None):
+        """Returns a cached answer for a sufficiently similar question, or None."""
+        normalized = normalize(question)
+        with self._lock:
+            self._check_version(prompt_version)
+            if len(normalized) < self.min_chars:
+                self._stats["skipped"] += 1
+                return None
+            self._stats["lookups"] += 1
+            now = time.time()
+
+            entry = self._entries.get(normalized)
+            if entry and now - entry["created_at"] < self.ttl:
+                self._entries.move_to_end(normalized)
+                self._record_hit("exact_hits", entry)
+                return entry["answer"]
+
+            vector = trigram_vector(normalized)
+            shared = Counter()
+            for gram in vector:
+                for key in self._index.get(gram, ()):
+                    shared[key] += 1
+
+            best_key, best_score = None, 0.0
+            for key, _ in shared.most_common(self.max_candidates):
+                candidate = self._entries[key]
+                if now - candidate["created_at"] >= self.ttl:
+                    self._remove(key)
+                    continue
+                score = cosine(vector, candidate["vector"])
+                if score > best_score and score >= self.threshold and same_words(normalized, key):
+                    best_key, best_score = key, score
+
+            if best_key is not None:
+                entry = self._entries[best_key]
+                self._entries.move_to_end(best_key)
+                self._record_hit("similar_hits", entry)
+                print(f"⚡ [FAQ] Cache hit (similarity {best_score:.2f}): '{question[:40]}' ~ '{best_key[:40]}'")
+                return entry["answer"]
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, question, answer, prompt_version=None, generation_seconds=None):
+        """Caches the answer generated for question (generation_seconds feeds the 'saved' estimate)."""
+        normalized = normalize(question)
+        with self._lock:
+            self._check_version(prompt_version)
+            if generation_seconds is not None:
+                avg = self._avg_generation_seconds
+                self._avg_generation_seconds = generation_seconds if avg is None else 0.9 * avg + 0.1 * generation_seconds
+            if len(normalized) < self.min_chars:
+                return
+
+            if normalized in self._entries:
+                self._remove(normalized)
+            vector = trigram_vector(normalized)
+            self._entries[normalized] = {"answer": answer, "vector": vector, "created_at": time.time(), "hits": 0}
+            for gram in vector:
+                self._index.setdefault(gram, set()).add(normalized)
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["avg_generation_seconds"] = self._avg_generation_seconds
+        hits = stats["exact_hits"] + stats["similar_hits"]
+        stats["hit_rate"] = hits / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
@@ -0,0 +1,289 @@
+import asyncio
+import base64
+import os
+from datetime import datetime, timedelta
+
+import asyncpg
+from dotenv import load_dotenv
+from app.services.database import user_cache, last_interaction_buffer
+from app.utils.jid import canonical_phone
+
+# Async counterpart of app.services.database for the FastAPI routes.
+# The WhatsApp thread keeps using the synchronous psycopg2 layer.
+load_dotenv()
+
+_pool = None
+_pool_lock = None
+
+async def get_pool():
+    """Return the shared asyncpg pool, creating it on first use."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        if _pool is None:
+            db_url = os.getenv("DATABASE_URL")
+
+            if not db_url:
+                print("❌ [ADB] DATABASE_URL environment variable not set!")
+                raise ValueError("DATABASE_URL environment variable not set")
+
+            min_size = int(os.getenv("ASYNC_DB_POOL_MIN", "1"))
+            max_size = int(os.getenv("ASYNC_DB_POOL_MAX", "5"))
+            print(f"🔵 [ADB] Creating async PostgreSQL pool (min={min_size}, max={max_size})...")
+            _pool = await asyncpg.create_pool(
+                db_url,
+                min_size=min_size,
+                max_size=max_size,
+                command_timeout=float(os.getenv("ASYNC_DB_COMMAND_TIMEOUT", "30")),
+            )
+    return _pool
+
+def get_pool_stats():
+    """Return async pool counters."""
+    if _pool is None:
+        return {"size": 0, "idle": 0, "in_use": 0}
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    return {
+        "size": size,
+        "idle": idle,
+        "in_use": size - idle,
+        "min": _pool.get_min_size(),
+        "max": _pool.get_max_size(),
+    }
+
+async def close_pool():
+    """Close the async pool (called on application shutdown)."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def _to_dict(record):
+    # Keep the same row shape as the RealDictCursor rows returned by app.services.database
+    return dict(record) if record is not None else None
+
+async def get_user_by_phone(phone):
+    """Get user by phone number (shares the user cache of app.services.database)."""
+    phone = canonical_phone(phone, add_country_code=False)
+    found, user = user_cache.get(phone)
+    if found:
+        return dict(user) if user else None
+    try:
+        pool = await get_pool()
+        user = _to_dict(await pool.fetchrow("SELECT * FROM users WHERE phone = $1", phone))
+        user_cache.set(phone, user)
+        return dict(user) if user else None
+    except Exception as e:
+        print(f"❌ [ADB] Error getting user: {e}")
+        return None
+
+async def create_user(phone, name):
+    """Create a new user."""
+    phone = canonical_phone(phone, add_country_code=False)
+    try:
+        pool = await get_pool()
+        user_id = await pool.fetchval(
+            "INSERT INTO users (phone, name) VALUES ($1, $2) RETURNING id",
+            phone, name
+        )
+        user_cache.invalidate(phone)
+        print(f"✅ [ADB] User created successfully: {name} ({phone}) - ID: {user_id}")
+        return user_id
+    except asyncpg.UniqueViolationError as e:
+        user_cache.invalidate(phone)
+        print(f"⚠️ [ADB] User already exists: {phone} - {e}")
+        return None
+    except Exception as e:
+        print(f"❌ [ADB] Error creating user: {e}")
+        return None
+
+async def update_last_interaction(phone):
+    """Record the last interaction timestamp for a user (shares the write-behind buffer of app.services.database)."""
+    last_interaction_buffer.record(canonical_phone(phone, add_country_code=False))
+
+async def get_all_users():
+    """Get all users (for admin purposes)."""
+    try:
+        pool = await get_pool()
+        rows = await pool.fetch("SELECT * FROM users ORDER BY created_at DESC")
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Error getting all users: {e}")
+        return []
+
+# ===== REGISTRATION FORM FUNCTIONS =====
+
+async def create_registration(data):
+    """Create a new registration from form data."""
+    try:
+        pool = await get_pool()
+        registration_id = await pool.fetchval("""
+            INSERT INTO registrations
+            (nome, email, telefone, whatsapp, cep, endereco, numero, complemento,
+             bairro, cidade, estado, genero, cpf_cnpj)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+            RETURNING id
+        """,
+            data.get('nome'),
+            data.get('email'),
+            data.get('telefone'),
+            data.get('whatsapp'),
+            data.get('cep'),
+            data.get('endereco'),
+            data.get('numero'),
+            data.get('complemento'),
+            data.get('bairro'),
+            data.get('cidade'),
+            data.get('estado'),
+            data.get('genero'),
+            data.get('cpf_cnpj')
+        )
+        print(f"✅ Registration saved to database: {data.get('nome')} (ID: {registration_id})")
+        return registration_id
+    except Exception as e:
+        print(f"❌ Error saving registration: {e}")
+        return None
+
+async def get_all_registrations():
+    """Get all registrations (for admin purposes)."""
+    try:
+        pool = await get_pool()
+        rows = await pool.fetch("SELECT * FROM registrations ORDER BY created_at DESC")
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Error getting all registrations: {e}")
+        return []
+
+# ===== PAGINATED ADMIN LISTINGS =====
+# Keyset pagination on (created_at, id): each page costs one index range scan,
+# no matter how deep it is (unlike OFFSET). Indexes are created by database.init_db.
+
+def encode_cursor(row):
+    """Opaque cursor pointing right after the given row (rows without created_at are encoded as 'null')."""
+    created_at = row['created_at'].isoformat() if row['created_at'] is not None else "null"
+    raw = f"{created_at}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """Returns (created_at or None, id) or None if the cursor is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, row_id = raw.split("|")
+        return (None if created_at == "null" else datetime.fromisoformat(created_at)), int(row_id)
+    except Exception:
+        return None
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def _fetch_page(table, conditions, params, limit, cursor):
+    if cursor:
+        position = decode_cursor(cursor)
+        if position and position[0] is None:
+            # ORDER BY created_at DESC puts NULLs first: the rest of the NULL rows, then all dated rows
+            params.append(position[1])
+            conditions.append(f"((created_at IS NULL AND id < ${len(params)}) OR created_at IS NOT NULL)")
+        elif position:
+            # Row comparison is never true for NULL created_at, which were already listed
+            params.extend(position)
+            conditions.append(f"(created_at, id) < (${len(params) - 1}, ${len(params)})")
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit + 1)
+    query = f"SELECT * FROM {table} {where} ORDER BY created_at DESC, id DESC LIMIT ${len(params)}"
+
+    pool = await get_pool()
+    rows = [dict(row) for row in await pool.fetch(query, *params)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+def _registration_filters(cidade=None, estado=None, date_from=None, date_to=None, nome_prefix=None):
+    """Builds the WHERE conditions (and asyncpg params) shared by the listing and the export."""
+    conditions, params = [], []
+    if cidade:
+        params.append(cidade.strip())
+        conditions.append(f"lower(cidade) = lower(${len(params)})")
+    if estado:
+        params.append(estado.strip().upper())
+        conditions.append(f"estado = ${len(params)}")
+    if date_from:
+        params.append(datetime.combine(date_from, datetime.min.time()))
+        conditions.append(f"created_at >= ${len(params)}")
+    if date_to:
+        params.append(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+        conditions.append(f"created_at < ${len(params)}")
+    if nome_prefix:
+        params.append(_escape_like(nome_prefix.strip().lower()) + "%")
+        conditions.append(f"lower(nome) LIKE ${len(params)}")
+    return conditions, params
+
+async def get_registrations_page(limit=50, cursor=None, **filters):
+    """
+    One page of registrations, newest first.
+    Filters: cidade, estado, date_from/date_to (inclusive dates), nome_prefix.
+    Returns (rows, next_cursor).
+    """
+    conditions, params = _registration_filters(**filters)
+    try:
+        return await _fetch_page("registrations", conditions, params, limit, cursor)
+    except Exception as e:
+        print(f"Error getting registrations page: {e}")
+        return [], None
+
+async def stream_registrations(batch_size=500, **filters):
+    """
+    Yields lists of registration rows (oldest first) read through a server-side cursor,
+    so only one batch is held in memory at a time. Accepts the same filters as
+    get_registrations_page.
+    """
+    conditions, params = _registration_filters(**filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT * FROM registrations {where} ORDER BY created_at, id"
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        # Server-side cursors only live inside a transaction
+        async with conn.transaction(readonly=True):
+            cursor = await conn.cursor(query, *params)
+            while True:
+                rows = await cursor.fetch(batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+
+async def get_users_page(limit=50, cursor=None, name_prefix=None):
+    """One page of WhatsApp users, newest first. Returns (rows, next_cursor)."""
+    conditions, params = [], []
+    if name_prefix:
+        params.append(_escape_like(name_prefix.strip().lower()) + "%")
+        conditions.append(f"lower(name) LIKE ${len(params)}")
+
+    try:
+        return await _fetch_page("users", conditions, params, limit, cursor)
+    except Exception as e:
+        print(f"Error getting users page: {e}")
+        return [], None
+
+async def estimate_count(table):
+    """Row count for the page header: exact for small tables, planner estimate otherwise."""
+    if table not in ("users", "registrations"):
+        raise ValueError(f"Unknown table: {table}")
+    try:
+        pool = await get_pool()
+        estimate = await pool.fetchval("SELECT reltuples::bigint FROM pg_class WHERE oid = $1::regclass", table)
+        if estimate is None or estimate < 10000:
+            return await pool.fetchval(f"SELECT COUNT(*) FROM {table}")
+        return estimate
+    except Exception as e:
+        print(f"Error counting {table}: {e}")
+        return None
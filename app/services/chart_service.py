@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import threading
+from app.services import database
+
+# Chart PNGs are rendered in the background and only when the data they are built from changes.
+# The admin page just links the current files; StaticFiles serves them with ETag/Last-Modified.
+
+CHARTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "charts")
+MANIFEST_FILE = os.path.join(CHARTS_DIR, "manifest.json")
+CHART_FILES = ["grafico_pizza_usuarios.png", "grafico_barra_cadastros.png"]
+VERSION_CHECK_INTERVAL = float(os.getenv("CHART_VERSION_CHECK_INTERVAL", "30"))
+
+_lock = threading.Lock()
+_state = {"version": None, "rendered_at": None, "checked_at": 0.0, "refreshing": False}
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        _state["version"] = manifest.get("version")
+        _state["rendered_at"] = manifest.get("rendered_at")
+    except (OSError, ValueError):
+        pass
+
+def _save_manifest():
+    tmp_path = f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": _state["version"], "rendered_at": _state["rendered_at"]}, f)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def get_data_version():
+    """Cheap fingerprint of the tables the charts are built from (row count + max id)."""
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM users) AS users_count,
+                (SELECT COALESCE(MAX(id), 0) FROM users) AS users_max_id,
+                (SELECT COUNT(*) FROM registrations) AS registrations_count,
+                (SELECT COALESCE(MAX(id), 0) FROM registrations) AS registrations_max_id
+        """)
+        row = cursor.fetchone()
+        cursor.close()
+    return f"u{row['users_count']}-{row['users_max_id']}.r{row['registrations_count']}-{row['registrations_max_id']}"
+
+def _refresh():
+    try:
+        version = get_data_version()
+        charts_exist = all(os.path.exists(os.path.join(CHARTS_DIR, name)) for name in CHART_FILES)
+        if version == _state["version"] and charts_exist:
+            return
+
+        print(f"📊 [CHARTS] Data changed ({_state['version']} -> {version}), re-rendering charts...")
+        from app.scripts.generate_charts import generate_charts
+        started = time.time()
+        if not generate_charts():
+            # Version left as is: the next check renders again
+            print(f"❌ [CHARTS] Rendering failed, keeping version {_state['version']}")
+            return
+
+        with _lock:
+            _state["version"] = version
+            _state["rendered_at"] = time.time()
+            _save_manifest()
+        print(f"✅ [CHARTS] Charts rendered in {time.time() - started:.2f}s")
+    except Exception as e:
+        print(f"❌ [CHARTS] Error refreshing charts: {e}")
+    finally:
+        with _lock:
+            _state["refreshing"] = False
+
+def refresh_in_background(force=False):
+    """
+    Schedules a data-version check (at most once per VERSION_CHECK_INTERVAL) and
+    re-renders the charts in a background thread if the data changed. Never blocks.
+    """
+    with _lock:
+        if _state["refreshing"]:
+            return
+        if not force and time.time() - _state["checked_at"] < VERSION_CHECK_INTERVAL:
+            return
+        _state["checked_at"] = time.time()
+        _state["refreshing"] = True
+
+    threading.Thread(target=_refresh, name="chart-refresh", daemon=True).start()
+
+def get_chart_version():
+    """Version of the rendered charts (used as a cache-busting query string)."""
+    return _state["version"] or "0"
+
+def get_chart_stats():
+    with _lock:
+        return {k: v for k, v in _state.items()}
+
+_load_manifest()
@@ -0,0 +1,167 @@
+import time
+import threading
+from collections import deque
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # optional dependency: fall back to a ~4 chars/token estimate
+    _encoding = None
+
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 765  # OpenAI Vision cost of a 'high' detail 1024x1024 image (85 for 'low')
+IMAGE_PLACEHOLDER = "[imagem enviada anteriormente]"
+
+def count_text_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+def count_tokens(message):
+    """Approximate prompt tokens used by one chat message (text + images)."""
+    content = message.get("content")
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    if isinstance(content, str):
+        return tokens + count_text_tokens(content)
+    for part in content or []:
+        if part.get("type") == "text":
+            tokens += count_text_tokens(part["text"])
+        elif part.get("type") == "image_url":
+            tokens += 85 if part["image_url"].get("detail") == "low" else IMAGE_TOKENS
+    return tokens
+
+def _message_text(message):
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    return " ".join(part["text"] for part in content or [] if part.get("type") == "text")
+
+def _truncate_to_tokens(text, max_tokens):
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+class ConversationMemory:
+    """
+    Per-chat message history bounded by a token budget.
+
+    build_context() returns the newest messages that fit in ``token_budget``; older turns
+    are dropped and folded into a short truncated recap sent as a system message.
+    Image payloads are replaced by a text placeholder once they have been sent once,
+    and chats idle for longer than ``ttl`` seconds are forgotten.
+    """
+
+    def __init__(self, token_budget=3000, max_messages=40, ttl=3600.0, summary_chars=600, sweep_interval=60.0):
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.summary_chars = summary_chars
+        self.sweep_interval = sweep_interval
+
+        self._chats = {}  # chat_id -> {"messages": deque, "summary": str, "last_active": float}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._stats = {"chats_expired": 0, "messages_summarized": 0, "messages_truncated": 0, "images_evicted": 0}
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = {"messages": deque(), "summary": "", "last_active": time.monotonic()}
+        return chat
+
+    def add(self, chat_id, message):
+        """Stores one message ({"role": ..., "content": ...}) for the chat."""
+        with self._lock:
+            chat = self._chat(chat_id)
+            chat["messages"].append({"message": message, "tokens": count_tokens(message)})
+            chat["last_active"] = time.monotonic()
+            while len(chat["messages"]) > self.max_messages:
+                self._summarize(chat, chat["messages"].popleft())
+        self._maybe_sweep()
+
+    def has_history(self, chat_id):
+        """True if the chat already has messages or a recap (its next answer may depend on them)."""
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            return chat is not None and bool(chat["messages"] or chat["summary"])
+
+    def _summarize(self, chat, entry):
+        text = _message_text(entry["message"]).strip()
+        if text:
+            speaker = "Cliente" if entry["message"]["role"] == "user" else "Assistente"
+            # Keep only the most recent part of the recap
+            chat["summary"] = f"{chat['summary']}\n{speaker}: {text}"[-self.summary_chars:]
+        self._stats["messages_summarized"] += 1
+
+    def build_context(self, chat_id):
+        """Messages to send to the model for this chat, within the token budget."""
+        with self._lock:
+            chat = self._chat(chat_id)
+            chat["last_active"] = time.monotonic()
+            messages = chat["messages"]
+
+            summary_tokens = count_text_tokens(chat["summary"]) + MESSAGE_OVERHEAD_TOKENS if chat["summary"] else 0
+            budget = self.token_budget - summary_tokens
+            used, keep = 0, 0
+            for entry in reversed(messages):
+                if used + entry["tokens"] > budget and keep > 0:
+                    break
+                used += entry["tokens"]
+                keep += 1
+
+            # Older turns no longer fit: fold them into the recap and drop them
+            for _ in range(len(messages) - keep):
+                self._summarize(chat, messages.popleft())
+
+            context = []
+            if chat["summary"]:
+                context.append({"role": "system", "content": f"Resumo da conversa anterior (truncado):{chat['summary']}"})
+
+            for entry in messages:
+                message = entry["message"]
+                if entry["tokens"] > self.token_budget and isinstance(message.get("content"), str):
+                    # A single oversized message: send only what fits
+                    message = {**message, "content": _truncate_to_tokens(message["content"], self.token_budget)}
+                    self._stats["messages_truncated"] += 1
+                context.append(message)
+
+            self._evict_images(messages)
+            return context
+
+    def _evict_images(self, messages):
+        # Images are only useful for the turn they were sent in; later turns rely on the answer
+        for entry in messages:
+            content = entry["message"].get("content")
+            if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+                entry["message"] = {
+                    **entry["message"],
+                    "content": [
+                        part if part.get("type") != "image_url" else {"type": "text", "text": IMAGE_PLACEHOLDER}
+                        for part in content
+                    ],
+                }
+                entry["tokens"] = count_tokens(entry["message"])
+                self._stats["images_evicted"] += 1
+
+    def clear(self, chat_id):
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        with self._lock:
+            self._last_sweep = now
+            expired = [chat_id for chat_id, chat in self._chats.items() if now - chat["last_active"] > self.ttl]
+            for chat_id in expired:
+                del self._chats[chat_id]
+            self._stats["chats_expired"] += len(expired)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["chats"] = len(self._chats)
+            stats["messages"] = sum(len(chat["messages"]) for chat in self._chats.values())
+            stats["tokens"] = sum(entry["tokens"] for chat in self._chats.values() for entry in chat["messages"])
+        return stats
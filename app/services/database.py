@@ -1,92 +1,186 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from dotenv import load_dotenv
+from app.services.db_pool import ConnectionPool
+from app.utils.cache import TTLCache
+from app.utils.jid import canonical_phone
 
 # Force load .env to ensure DATABASE_URL is available even if imported early
 load_dotenv()
 
 # PostgreSQL connection using DATABASE_URL from Railway
-# We will fetch it dynamically in get_connection to be safe, but keep a module level default for init
+# We will fetch it dynamically when the pool is created to be safe, but keep a module level default for init
 _DATABASE_URL = os.getenv("DATABASE_URL")
 
-def get_connection():
-    """Create and return a PostgreSQL connection."""
-    # Re-fetch or use cached
-    db_url = os.getenv("DATABASE_URL")
-    
-    if not db_url:
-        print("❌ [DB] DATABASE_URL environment variable not set!")
-        raise ValueError("DATABASE_URL environment variable not set")
-        
-    print(f"🔵 [DB] Connecting to PostgreSQL...")
-    return psycopg2.connect(db_url, cursor_factory=RealDictCursor)
+# Read-through cache for get_user_by_phone (unknown phones are cached too, with a shorter TTL)
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("USER_CACHE_NEGATIVE_TTL", "60")),
+)
+
+# Shared connection pool (created lazily on first use)
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use."""
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None:
+            db_url = os.getenv("DATABASE_URL")
+
+            if not db_url:
+                print("❌ [DB] DATABASE_URL environment variable not set!")
+                raise ValueError("DATABASE_URL environment variable not set")
+
+            minconn = int(os.getenv("DB_POOL_MIN", "1"))
+            maxconn = int(os.getenv("DB_POOL_MAX", "5"))
+            print(f"🔵 [DB] Creating PostgreSQL connection pool (min={minconn}, max={maxconn})...")
+            _pool = ConnectionPool(
+                db_url,
+                minconn=minconn,
+                maxconn=maxconn,
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                ping_after=float(os.getenv("DB_POOL_PING_AFTER", "30")),
+                cursor_factory=RealDictCursor,
+            )
+    return _pool
+
+@contextmanager
+def connection():
+    """Check out a pooled PostgreSQL connection for the duration of the block."""
+    with get_pool().connection() as conn:
+        yield conn
+
+def get_user_cache_stats():
+    """Return hit/miss/eviction counters of the user lookup cache."""
+    return user_cache.stats()
+
+def get_last_interaction_stats():
+    """Return counters of the last_interaction write-behind buffer."""
+    return last_interaction_buffer.stats()
+
+def get_pool_stats():
+    """Return connection pool counters (checkouts, wait time, in-use...)."""
+    if _pool is None:
+        return {"size": 0, "idle": 0, "in_use": 0, "checkouts": 0}
+    return _pool.stats()
+
+def close_pool():
+    """Close all pooled connections (called on application shutdown)."""
+    global _pool
+    # Drain write-behind updates while the pool is still open
+    last_interaction_buffer.close()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
 
 def init_db():
     """Initialize the database and create tables if they don't exist."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                phone VARCHAR(20) UNIQUE NOT NULL,
-                name VARCHAR(255) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_interaction TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create registrations table for form submissions
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS registrations (
-                id SERIAL PRIMARY KEY,
-                nome VARCHAR(255) NOT NULL,
-                email VARCHAR(255) NOT NULL,
-                telefone VARCHAR(20) NOT NULL,
-                whatsapp VARCHAR(20),
-                cep VARCHAR(10),
-                endereco VARCHAR(255),
-                numero VARCHAR(20),
-                complemento VARCHAR(255),
-                bairro VARCHAR(100),
-                cidade VARCHAR(100),
-                estado VARCHAR(2),
-                genero VARCHAR(50),
-                cpf_cnpj VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print("✅ PostgreSQL database initialized successfully (users + registrations tables)")
+        with connection() as conn:
+            cursor = conn.cursor()
+
+            # Create users table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id SERIAL PRIMARY KEY,
+                    phone VARCHAR(20) UNIQUE NOT NULL,
+                    name VARCHAR(255) NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_interaction TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Create registrations table for form submissions
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS registrations (
+                    id SERIAL PRIMARY KEY,
+                    nome VARCHAR(255) NOT NULL,
+                    email VARCHAR(255) NOT NULL,
+                    telefone VARCHAR(20) NOT NULL,
+                    whatsapp VARCHAR(20),
+                    cep VARCHAR(10),
+                    endereco VARCHAR(255),
+                    numero VARCHAR(20),
+                    complemento VARCHAR(255),
+                    bairro VARCHAR(100),
+                    cidade VARCHAR(100),
+                    estado VARCHAR(2),
+                    genero VARCHAR(50),
+                    cpf_cnpj VARCHAR(20),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Indexes for the paginated admin listings (keyset on created_at, id + filters)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users (created_at DESC, id DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_name_prefix ON users (lower(name) text_pattern_ops)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_registrations_created_at_id ON registrations (created_at DESC, id DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_registrations_cidade ON registrations (lower(cidade), created_at DESC, id DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_registrations_estado ON registrations (estado, created_at DESC, id DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_registrations_nome_prefix ON registrations (lower(nome) text_pattern_ops)")
+
+            # Create jobs table for background side effects (see app/services/job_queue.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id SERIAL PRIMARY KEY,
+                    kind VARCHAR(50) NOT NULL,
+                    payload JSONB NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 5,
+                    last_error TEXT,
+                    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_pending_run_at
+                ON jobs (run_at, id) WHERE status = 'pending'
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_done_updated_at ON jobs (updated_at) WHERE status = 'done'")
+
+            conn.commit()
+            cursor.close()
+        print("✅ PostgreSQL database initialized successfully (users + registrations + jobs tables)")
     except Exception as e:
         print(f"❌ Error initializing database: {e}")
 
 def get_user_by_phone(phone):
-    """Get user by phone number."""
+    """Get user by phone number (served from user_cache when possible)."""
+    phone = canonical_phone(phone, add_country_code=False)
+    found, user = user_cache.get(phone)
+    if found:
+        return dict(user) if user else None
+
     print(f"🔍 [DB] Looking up user by phone: {phone}")
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users WHERE phone = %s", (phone,))
-        user = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
+        with connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT * FROM users WHERE phone = %s", (phone,))
+            user = cursor.fetchone()
+
+            cursor.close()
+
+        user_cache.set(phone, user)
         if user:
             print(f"✅ [DB] User found: {user['name']} (ID: {user['id']})")
         else:
             print(f"❌ [DB] User NOT found for phone: {phone}")
-        
-        return user
+
+        return dict(user) if user else None
     except Exception as e:
         print(f"❌ [DB] CRITICAL ERROR getting user: {e}")
         print(f"❌ [DB] Error type: {type(e).__name__}")
@@ -96,25 +190,26 @@ def get_user_by_phone(phone):
 
 def create_user(phone, name):
     """Create a new user."""
+    phone = canonical_phone(phone, add_country_code=False)
     print(f"🔵 [DB] Attempting to create user: {name} ({phone})")
     try:
-        conn = get_connection()
-        print(f"🔵 [DB] Connection established successfully")
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO users (phone, name) VALUES (%s, %s) RETURNING id",
-            (phone, name)
-        )
-        user_id = cursor.fetchone()['id']
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
+        with connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "INSERT INTO users (phone, name) VALUES (%s, %s) RETURNING id",
+                (phone, name)
+            )
+            user_id = cursor.fetchone()['id']
+
+            conn.commit()
+            cursor.close()
+
+        user_cache.invalidate(phone)
         print(f"✅ [DB] User created successfully: {name} ({phone}) - ID: {user_id}")
         return user_id
     except psycopg2.IntegrityError as e:
+        user_cache.invalidate(phone)
         print(f"⚠️ [DB] User already exists: {phone} - {e}")
         return None
     except Exception as e:
@@ -124,34 +219,117 @@ def create_user(phone, name):
         traceback.print_exc()
         return None
 
+class LastInteractionBuffer:
+    """
+    Write-behind buffer for users.last_interaction.
+
+    Keeps only the latest timestamp per phone and flushes all of them in a single
+    UPDATE ... FROM (VALUES ...) statement every ``flush_interval`` seconds, or sooner
+    when ``max_pending`` phones are waiting. Call close() on shutdown to drain it.
+    """
+
+    def __init__(self, flush_interval=10.0, max_pending=200):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}  # phone -> datetime
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"recorded": 0, "coalesced": 0, "flushes": 0, "rows_flushed": 0, "failures": 0}
+
+    def record(self, phone, when=None):
+        when = when or datetime.now()
+        with self._lock:
+            self._stats["recorded"] += 1
+            previous = self._pending.get(phone)
+            if previous is not None:
+                self._stats["coalesced"] += 1
+                when = max(previous, when)
+            self._pending[phone] = when
+            full = len(self._pending) >= self.max_pending
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="last-interaction-flusher", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Writes all pending timestamps in one statement. Returns the number of phones flushed."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            try:
+                with connection() as conn:
+                    cursor = conn.cursor()
+                    execute_values(cursor, """
+                        UPDATE users AS u
+                        SET last_interaction = v.ts
+                        FROM (VALUES %s) AS v(phone, ts)
+                        WHERE u.phone = v.phone
+                          AND (u.last_interaction IS NULL OR u.last_interaction < v.ts)
+                    """, list(batch.items()), template="(%s, %s::timestamp)", page_size=len(batch))
+                    conn.commit()
+                    cursor.close()
+            except Exception as e:
+                print(f"Error flushing last interactions ({len(batch)} users): {e}")
+                # Put the batch back without overwriting newer timestamps recorded meanwhile
+                with self._lock:
+                    self._stats["failures"] += 1
+                    for phone, when in batch.items():
+                        if phone not in self._pending or self._pending[phone] < when:
+                            self._pending[phone] = when
+                return 0
+
+            with self._lock:
+                self._stats["flushes"] += 1
+                self._stats["rows_flushed"] += len(batch)
+            return len(batch)
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        return stats
+
+    def close(self):
+        """Stops the flusher thread and drains pending updates."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+
+last_interaction_buffer = LastInteractionBuffer(
+    flush_interval=float(os.getenv("LAST_INTERACTION_FLUSH_INTERVAL", "10")),
+    max_pending=int(os.getenv("LAST_INTERACTION_MAX_PENDING", "200")),
+)
+
 def update_last_interaction(phone):
-    """Update the last interaction timestamp for a user."""
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE users SET last_interaction = %s WHERE phone = %s",
-            (datetime.now(), phone)
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-    except Exception as e:
-        print(f"Error updating last interaction: {e}")
+    """Record the last interaction timestamp for a user (written in batches by last_interaction_buffer)."""
+    last_interaction_buffer.record(canonical_phone(phone, add_country_code=False))
 
 def get_all_users():
     """Get all users (for admin purposes)."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
-        users = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
+            users = cursor.fetchall()
+
+            cursor.close()
         return users
     except Exception as e:
         print(f"Error getting all users: {e}")
@@ -162,37 +340,36 @@ def get_all_users():
 def create_registration(data):
     """Create a new registration from form data."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO registrations 
-            (nome, email, telefone, whatsapp, cep, endereco, numero, complemento, 
-             bairro, cidade, estado, genero, cpf_cnpj)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            data.get('nome'),
-            data.get('email'),
-            data.get('telefone'),
-            data.get('whatsapp'),
-            data.get('cep'),
-            data.get('endereco'),
-            data.get('numero'),
-            data.get('complemento'),
-            data.get('bairro'),
-            data.get('cidade'),
-            data.get('estado'),
-            data.get('genero'),
-            data.get('cpf_cnpj')
-        ))
-        
-        registration_id = cursor.fetchone()['id']
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
+        with connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                INSERT INTO registrations 
+                (nome, email, telefone, whatsapp, cep, endereco, numero, complemento, 
+                 bairro, cidade, estado, genero, cpf_cnpj)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (
+                data.get('nome'),
+                data.get('email'),
+                data.get('telefone'),
+                data.get('whatsapp'),
+                data.get('cep'),
+                data.get('endereco'),
+                data.get('numero'),
+                data.get('complemento'),
+                data.get('bairro'),
+                data.get('cidade'),
+                data.get('estado'),
+                data.get('genero'),
+                data.get('cpf_cnpj')
+            ))
+
+            registration_id = cursor.fetchone()['id']
+
+            conn.commit()
+            cursor.close()
+
         print(f"✅ Registration saved to database: {data.get('nome')} (ID: {registration_id})")
         return registration_id
     except Exception as e:
@@ -202,22 +379,14 @@ def create_registration(data):
 def get_all_registrations():
     """Get all registrations (for admin purposes)."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM registrations ORDER BY created_at DESC")
-        registrations = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT * FROM registrations ORDER BY created_at DESC")
+            registrations = cursor.fetchall()
+
+            cursor.close()
         return registrations
     except Exception as e:
         print(f"Error getting all registrations: {e}")
         return []
-
-# Initialize database on module import
-try:
-    init_db()
-except Exception as e:
-    print(f"⚠️ Could not initialize database on import: {e}")
-    print("Database will be initialized on first connection attempt")
@@ -1,120 +1,276 @@
-import smtplib
 import os
+import time
+import html
+import queue
+import smtplib
+import threading
+from string import Template
+from concurrent.futures import Future
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import requests
-import json
-
-def send_via_brevo_api(to_email, data, html_content, api_key, sender_email):
-    """
-    Sends email via Brevo REST API (HTTPS Port 443) to bypass SMTP port blocks.
-    """
-    url = "https://api.brevo.com/v3/smtp/email"
-    headers = {
-        "accept": "application/json",
-        "api-key": api_key,
-        "content-type": "application/json"
-    }
-    
-    payload = {
-        "sender": {"name": "Dbnet", "email": sender_email},
-        "to": [{"email": to_email}],
-        "subject": "Confirmação de Cadastro - Shopfono",
-        "htmlContent": html_content
-    }
-    
-    try:
-        api_key_clean = api_key.strip() if api_key else ""
-        print(f"🚀 Enviando via API Brevo (Porta 443)...")
-        print(f" debug: Key len={len(api_key_clean)}, Prefix={api_key_clean[:5]}... (v3 expected)")
-        
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=15)
-        if response.status_code in [201, 202, 200]:
-            print(f"✅ Email enviado com sucesso via API! (ID: {response.json().get('messageId')})")
-            return True
-        else:
-            print(f"❌ Erro na API Brevo ({response.status_code}): {response.text}")
-            return False
-    except Exception as e:
-        print(f"❌ Erno na requisição API: {e}")
-        return False
 
-def send_registration_email(to_email, data):
-    """
-    Sends a registration confirmation email with all form data to the user.
-    """
-    smtp_host = os.getenv("SMTP_HOST")
-    smtp_port = os.getenv("SMTP_PORT", "2525")
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_password = os.getenv("SMTP_PASSWORD")
+# Outbound email goes through a send queue drained by a few worker threads. Confirmations
+# that pile up (campaign days) are sent to Brevo as a single batch request (messageVersions),
+# over a keep-alive HTTP session; other providers reuse pooled, already-authenticated SMTP
+# connections instead of doing STARTTLS + login for every email.
 
-    # Debug info (masked)
-    print(f"🔍 Verificando variáveis no ambiente: HOST={'OK' if smtp_host else 'MISSING'}, USER={'OK' if smtp_user else 'MISSING'}, PASS={'OK' if smtp_password else 'MISSING'}")
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_BATCH_MAX = int(os.getenv("EMAIL_BATCH_MAX", "50"))
+# Emails already queued always join the batch; this is how long to wait for more (0 = don't)
+EMAIL_BATCH_WINDOW = float(os.getenv("EMAIL_BATCH_WINDOW", "0"))
+SMTP_IDLE_CHECK = float(os.getenv("SMTP_IDLE_CHECK", "30"))
 
-    if not all([smtp_host, smtp_user, smtp_password]):
-        print(f"⚠️ Erro: Credenciais incompletas. Verifique SMTP_USER e SMTP_PASSWORD.")
-        return False
+SUBJECT = "Confirmação de Cadastro - Shopfono"
+BREVO_URL = "https://api.brevo.com/v3/smtp/email"
 
-    # HTML Body
-    html_content = f"""
+# Templates are parsed once; every value is HTML-escaped before being substituted
+_PAGE = Template("""
     <html>
     <body style="font-family: sans-serif; color: #1e293b; line-height: 1.6;">
         <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e2e8f0; border-radius: 12px;">
-            <h2 style="color: #6366f1; text-align: center;">Olá {data.get('Nome')}, seu cadastro foi recebido!</h2>
+            <h2 style="color: #6366f1; text-align: center;">Olá $nome, seu cadastro foi recebido!</h2>
             <p>Obrigado por se cadastrar na Shopfono. Confira abaixo os dados enviados:</p>
-            
+
             <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
                 <tr style="background-color: #f1f5f9;">
                     <th style="padding: 10px; border: 1px solid #e2e8f0; text-align: left;">Campo</th>
                     <th style="padding: 10px; border: 1px solid #e2e8f0; text-align: left;">Valor</th>
                 </tr>
-    """
-    
-    for key, value in data.items():
-        html_content += f"""
-                <tr>
-                    <td style="padding: 10px; border: 1px solid #e2e8f0; font-weight: bold;">{key}</td>
-                    <td style="padding: 10px; border: 1px solid #e2e8f0;">{value}</td>
-                </tr>
-        """
-        
-    html_content += """
+$rows
             </table>
-            
+
             <p style="margin-top: 30px; text-align: center; color: #64748b; font-size: 0.9rem;">
                 Este é um email automático. Por favor, não responda.
             </p>
         </div>
     </body>
     </html>
-    """
+""")
+
+_ROW = Template("""
+                <tr>
+                    <td style="padding: 10px; border: 1px solid #e2e8f0; font-weight: bold;">$key</td>
+                    <td style="padding: 10px; border: 1px solid #e2e8f0;">$value</td>
+                </tr>""")
+
+def render_registration_email(data):
+    rows = "".join(_ROW.substitute(key=html.escape(str(key)), value=html.escape(str(value))) for key, value in data.items())
+    return _PAGE.substitute(nome=html.escape(str(data.get("Nome") or "")), rows=rows)
+
+class SMTPPool:
+    """Keeps up to ``size`` logged-in SMTP connections; idle ones are checked with NOOP before reuse."""
+
+    def __init__(self, host, port, user, password, size=2):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.password = password
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.opened = 0
+        self.reused = 0
+
+    def _connect(self):
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=30)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+            server.starttls()
+        server.login(self.user, self.password)
+        self.opened += 1
+        return server
+
+    def get(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            try:
+                if time.monotonic() - last_used > SMTP_IDLE_CHECK and server.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+                self.reused += 1
+                return server
+            except Exception:
+                self.discard(server)
+
+    def put(self, server):
+        try:
+            self._idle.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self.discard(server)
 
-    # If it's Brevo, use API by default as SMTP is blocked on Railway
-    if smtp_host and "brevo" in smtp_host.lower():
-        return send_via_brevo_api(to_email, data, html_content, smtp_password, smtp_user)
-
-    # Fallback/Legacy SMTP for other providers
-    # [Rest of existing SMTP logic if needed, but for now we focus on Brevo fix]
-    try:
-        # Create Message
-        message = MIMEMultipart()
-        message["From"] = smtp_user
-        message["To"] = to_email
-        message["Subject"] = "Confirmação de Cadastro - Shopfono"
-        message.attach(MIMEText(html_content, "html"))
-
-        port_int = int(smtp_port)
-        if port_int == 465:
-            server_class = smtplib.SMTP_SSL
+    def discard(self, server):
+        try:
+            server.quit()
+        except Exception:
+            pass
+
+class EmailSender:
+    def __init__(self):
+        self.smtp_host = os.getenv("SMTP_HOST")
+        self.smtp_port = os.getenv("SMTP_PORT", "2525")
+        self.smtp_user = os.getenv("SMTP_USER")
+        self.smtp_password = os.getenv("SMTP_PASSWORD")
+        # If it's Brevo, use the API by default as SMTP is blocked on Railway
+        self.provider = "brevo" if self.smtp_host and "brevo" in self.smtp_host.lower() else "smtp"
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # Created before the workers start, so all of them share one session / one pool
+        self._session = None
+        self._smtp_pool = None
+        if self.provider == "brevo":
+            self._session = requests.Session()
+            self._session.headers.update({
+                "accept": "application/json",
+                "api-key": (self.smtp_password or "").strip(),
+                "content-type": "application/json",
+            })
+        elif self.configured:
+            self._smtp_pool = SMTPPool(self.smtp_host, self.smtp_port, self.smtp_user, self.smtp_password, size=EMAIL_WORKERS)
+        self._stats = {"sent": 0, "failed": 0, "batches": 0, "send_seconds": 0.0}
+
+        for i in range(EMAIL_WORKERS):
+            threading.Thread(target=self._worker, name=f"email-{i}", daemon=True).start()
+        print(f"✉️ [EMAIL] Sender started (provider={self.provider}, workers={EMAIL_WORKERS})")
+
+    @property
+    def configured(self):
+        return all([self.smtp_host, self.smtp_user, self.smtp_password])
+
+    def submit(self, to_email, html_content):
+        """Queues one email; the returned Future resolves to True/False."""
+        future = Future()
+        self._queue.put((to_email, html_content, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + EMAIL_BATCH_WINDOW
+        while len(batch) < EMAIL_BATCH_MAX:
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            started = time.monotonic()
+            try:
+                results = self._send_brevo(batch) if self.provider == "brevo" else self._send_smtp(batch)
+            except Exception as e:
+                print(f"❌ [EMAIL] Unexpected error sending batch: {e}")
+                results = [False] * len(batch)
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["sent"] += sum(1 for ok in results if ok)
+                self._stats["failed"] += sum(1 for ok in results if not ok)
+                self._stats["send_seconds"] += time.monotonic() - started
+            for (_, _, future), ok in zip(batch, results):
+                future.set_result(ok)
+
+    def _send_brevo(self, batch):
+        """Sends via Brevo REST API (HTTPS Port 443) to bypass SMTP port blocks; one request per batch."""
+        payload = {"sender": {"name": "Dbnet", "email": self.smtp_user}, "subject": SUBJECT}
+        if len(batch) == 1:
+            to_email, html_content, _ = batch[0]
+            payload.update({"to": [{"email": to_email}], "htmlContent": html_content})
         else:
-            server_class = smtplib.SMTP
-
-        with server_class(smtp_host, port_int, timeout=30) as server:
-            if port_int != 465:
-                server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.send_message(message)
-        return True
-    except Exception as e:
-        print(f"❌ Erro SMTP: {e}. Considere usar um serviço que suporte HTTP API.")
-        return False
+            # A single call with one version per recipient (each with its own rendered HTML)
+            payload["htmlContent"] = batch[0][1]
+            payload["messageVersions"] = [
+                {"to": [{"email": to_email}], "htmlContent": html_content} for to_email, html_content, _ in batch
+            ]
+
+        print(f"🚀 Enviando {len(batch)} email(s) via API Brevo (Porta 443)...")
+        try:
+            response = self._session.post(BREVO_URL, json=payload, timeout=15)
+        except Exception as e:
+            print(f"❌ Erro na requisição API: {e}")
+            return [False] * len(batch)
+        if response.status_code in [201, 202, 200]:
+            print(f"✅ {len(batch)} email(s) enviado(s) com sucesso via API!")
+            return [True] * len(batch)
+        print(f"❌ Erro na API Brevo ({response.status_code}): {response.text}")
+        if len(batch) > 1 and 400 <= response.status_code < 500 and response.status_code != 429:
+            # One bad address rejects the whole batch: send the emails one by one instead
+            print(f"🔁 Reenviando os {len(batch)} emails do lote individualmente...")
+            return [self._send_brevo([item])[0] for item in batch]
+        return [False] * len(batch)
+
+    def _send_smtp(self, batch):
+        results = []
+        server = None
+        for to_email, html_content, _ in batch:
+            message = MIMEMultipart()
+            message["From"] = self.smtp_user
+            message["To"] = to_email
+            message["Subject"] = SUBJECT
+            message.attach(MIMEText(html_content, "html"))
+            try:
+                server = server or self._smtp_pool.get()
+                server.send_message(message)
+                results.append(True)
+            except Exception as e:
+                print(f"❌ Erro SMTP: {e}. Considere usar um serviço que suporte HTTP API.")
+                if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)) and server is not None:
+                    self._smtp_pool.discard(server)
+                    server = None
+                results.append(False)
+        if server is not None:
+            self._smtp_pool.put(server)
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["provider"] = self.provider
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch_size"] = (stats["sent"] + stats["failed"]) / stats["batches"] if stats["batches"] else 0.0
+        stats["emails_per_second"] = stats["sent"] / stats["send_seconds"] if stats["send_seconds"] else 0.0
+        if self._smtp_pool is not None:
+            stats["smtp_connections_opened"] = self._smtp_pool.opened
+            stats["smtp_connections_reused"] = self._smtp_pool.reused
+        return stats
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def get_sender():
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = EmailSender()
+    return _sender
+
+def get_email_stats():
+    return _sender.stats() if _sender is not None else {"provider": None, "sent": 0, "failed": 0, "queued": 0}
+
+def queue_registration_email(to_email, data):
+    """
+    Queues the registration confirmation email with all form data and returns at once.
+    The returned Future resolves to True/False when the email was actually sent.
+    """
+    sender = get_sender()
+
+    # Debug info (masked)
+    print(f"🔍 Verificando variáveis no ambiente: HOST={'OK' if sender.smtp_host else 'MISSING'}, USER={'OK' if sender.smtp_user else 'MISSING'}, PASS={'OK' if sender.smtp_password else 'MISSING'}")
+
+    if not sender.configured:
+        print(f"⚠️ Erro: Credenciais incompletas. Verifique SMTP_USER e SMTP_PASSWORD.")
+        future = Future()
+        future.set_result(False)
+        return future
+
+    return sender.submit(to_email, render_registration_email(data))
+
+def send_registration_email(to_email, data):
+    """
+    Sends a registration confirmation email with all form data to the user.
+    Waits until the send queue has sent it, so it still returns True/False.
+    """
+    return queue_registration_email(to_email, data).result()
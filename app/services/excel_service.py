@@ -1,9 +1,191 @@
-import pandas as pd
 import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows (local development): only in-process locking
+    fcntl = None
+
 EXCEL_FILE = "vendas.xlsx"
 
+class ExcelSink:
+    """
+    Append-only writer for an Excel workbook shared by several processes.
+
+    append() only adds one JSON line to ``<path>.journal`` (constant cost, no matter how
+    big the workbook is). The journal is rolled into the workbook in batches, when it holds
+    ``roll_every`` rows or its oldest row is older than ``roll_interval`` seconds.
+    Rolling writes a temp file and renames it over the workbook. All journal and workbook
+    access happens under an exclusive file lock, so concurrent submissions are safe.
+
+    Every journal entry carries an increasing ``seq``, and the workbook records the last seq
+    it holds in a hidden sheet (saved in the same rename). A roll that crashed after the
+    rename but before the journal was cleared replays nothing twice: entries at or below
+    that seq are skipped. Rows appended with a ``key`` (a job id) are written once per key,
+    so a retried submission does not duplicate its row; the last ``KEEP_KEYS`` rolled keys
+    are kept in the same hidden sheet.
+    """
+
+    STATE_SHEET = "_journal"
+    KEEP_KEYS = 1000
+
+    def __init__(self, path=EXCEL_FILE, roll_every=50, roll_interval=30.0):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+        self.roll_every = roll_every
+        self.roll_interval = roll_interval
+        self._thread_lock = threading.Lock()
+        self._roll_thread = None
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        rows = []
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue  # partial line from an interrupted write
+        return rows
+
+    def append(self, row, key=None):
+        """Queues one row for the workbook. Returns the number of rows rolled (0 if only journaled)."""
+        with self._locked():
+            pending = self._read_journal()
+            if key is not None and any(entry.get("key") == key for entry in pending):
+                print(f"📊 Linha {key} já está no journal, ignorada", file=sys.stderr)
+                return 0
+            # Nanosecond clock, kept increasing within the journal: larger than any seq already rolled
+            seq = max([time.time_ns()] + [entry.get("seq", 0) + 1 for entry in pending[-1:]])
+            entry = {"seq": seq, "ts": time.time(), "row": row}
+            if key is not None:
+                entry["key"] = key
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            pending.append(entry)
+
+            # The row is durable from here on: a failed roll is retried by the next roll
+            try:
+                due = (len(pending) >= self.roll_every
+                       or (pending and time.time() - pending[0]["ts"] >= self.roll_interval))
+                return self._roll(pending) if due else 0
+            except Exception as e:
+                print(f"⚠️ Erro ao consolidar Excel (linha mantida no journal): {e}", file=sys.stderr)
+                return 0
+
+    def roll(self):
+        """Moves every journaled row into the workbook. Returns the number of rows written."""
+        with self._locked():
+            return self._roll(self._read_journal())
+
+    def _roll(self, entries):
+        if not entries:
+            return 0
+
+        from openpyxl import Workbook, load_workbook
+
+        if os.path.exists(self.path):
+            workbook = load_workbook(self.path)
+            sheet = workbook.worksheets[0]
+            header = [cell.value for cell in sheet[1] if cell.value is not None]
+        else:
+            workbook = Workbook()
+            sheet = workbook.active
+            header = []
+
+        if self.STATE_SHEET in workbook.sheetnames:
+            state = workbook[self.STATE_SHEET]
+        else:
+            state = workbook.create_sheet(self.STATE_SHEET)
+            state.sheet_state = "hidden"
+        rolled_seq = int(state["A1"].value or 0)
+        rolled_keys = [cell.value for (cell,) in state.iter_rows(min_row=2, max_col=1) if cell.value]
+        seen_keys = set(rolled_keys)
+
+        # Entries without seq come from journals written before seq existed
+        new_entries = []
+        for entry in entries:
+            key = entry.get("key")
+            if entry.get("seq", rolled_seq + 1) <= rolled_seq or (key is not None and key in seen_keys):
+                continue
+            if key is not None:
+                seen_keys.add(key)
+                rolled_keys.append(key)
+            new_entries.append(entry)
+        if len(new_entries) < len(entries):
+            print(f"📊 {len(entries) - len(new_entries)} linha(s) do journal já estavam em {self.path}", file=sys.stderr)
+        entries = new_entries
+        if not entries:
+            open(self.journal_path, "w").close()
+            return 0
+
+        for entry in entries:
+            row = entry["row"]
+            for key in row:
+                if key not in header:
+                    header.append(key)
+                    sheet.cell(row=1, column=len(header), value=key)
+            sheet.append([row.get(key) for key in header])
+        # As text: Excel numbers are doubles and would round a nanosecond seq
+        state["A1"] = str(max([rolled_seq] + [entry.get("seq", 0) for entry in entries]))
+        state.delete_rows(2, state.max_row)
+        for i, key in enumerate(rolled_keys[-self.KEEP_KEYS:], start=2):
+            state.cell(row=i, column=1, value=key)
+
+        tmp_path = f"{self.path}.tmp.xlsx"
+        workbook.save(tmp_path)
+        os.replace(tmp_path, self.path)
+        # Rows (and their seq) are in the workbook now; start a fresh journal
+        open(self.journal_path, "w").close()
+
+        # stderr: the scripts' stdout is their result (save_to_excel must start with ✅)
+        print(f"📊 {len(entries)} linha(s) gravada(s) em {self.path}", file=sys.stderr)
+        return len(entries)
+
+    def start_background_roll(self):
+        """Starts a daemon thread that rolls the journal every roll_interval seconds (long-running processes)."""
+        if self._roll_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.roll_interval)
+                try:
+                    self.roll()
+                except Exception as e:
+                    print(f"⚠️ Erro ao consolidar Excel: {e}", file=sys.stderr)
+
+        self._roll_thread = threading.Thread(target=loop, name="excel-roll", daemon=True)
+        self._roll_thread.start()
+
+sink = ExcelSink(
+    EXCEL_FILE,
+    roll_every=int(os.getenv("EXCEL_ROLL_EVERY", "50")),
+    roll_interval=float(os.getenv("EXCEL_ROLL_INTERVAL", "30")),
+)
+
 def save_to_excel(data):
     """
     Saves the received webhook data into an Excel spreadsheet.
@@ -11,24 +193,11 @@ def save_to_excel(data):
     """
     # Adiciona a data e hora do recebimento
     data['Data_Hora_Recebimento'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    
-    # Converte o dicionário em um DataFrame do Pandas
-    df_new = pd.DataFrame([data])
-    
-    if os.path.exists(EXCEL_FILE):
-        # Se o arquivo já existe, lê e concatena
-        try:
-            df_existing = pd.read_excel(EXCEL_FILE)
-            df_final = pd.concat([df_existing, df_new], ignore_index=True)
-            df_final.to_excel(EXCEL_FILE, index=False)
-            print(f"✅ Dados adicionados com sucesso ao arquivo {EXCEL_FILE}")
-        except Exception as e:
-            print(f"⚠️ Erro ao atualizar Excel: {e}")
-            # Tenta salvar como novo se falhar a leitura
-            df_new.to_excel(EXCEL_FILE, index=False)
-    else:
-        # Se não existe, cria um novo
-        df_new.to_excel(EXCEL_FILE, index=False)
-        print(f"📊 Novo arquivo {EXCEL_FILE} criado com os dados.")
+
+    try:
+        sink.append(data)
+        print(f"✅ Dados adicionados com sucesso ao arquivo {EXCEL_FILE}")
+    except Exception as e:
+        print(f"⚠️ Erro ao atualizar Excel: {e}")
 
     return EXCEL_FILE
@@ -1,8 +1,8 @@
-import os
-import json
 from app.services import database
+from app.utils.state_store import StateStore
+from app.utils.jid import canonical_phone
 
-# Simple file-based persistence for user states
+# User states live in memory; changes are journaled and compacted into this file
 STATE_FILE = "user_states.json"
 
 class UserState:
@@ -10,35 +10,19 @@ class UserState:
     COLLECTING_NAME = "COLLECTING_NAME"
     FREE_CHAT = "FREE_CHAT"
 
-def load_states():
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-def save_states(states):
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(states, f, ensure_ascii=False, indent=2)
+_store = StateStore(STATE_FILE)
 
 def get_user_state(chat_id):
-    states = load_states()
-    if chat_id not in states:
-        return {"state": UserState.START, "data": {}}
-    return states[chat_id]
+    return _store.get(chat_id, {"state": UserState.START, "data": {}})
 
 def update_user_state(chat_id, state, data=None):
-    states = load_states()
-    if chat_id not in states:
-        states[chat_id] = {"state": state, "data": {}}
-    
-    states[chat_id]["state"] = state
-    if data:
-        states[chat_id]["data"].update(data)
-    
-    save_states(states)
+    def apply(current):
+        current["state"] = state
+        if data:
+            current["data"].update(data)
+        return current
+
+    _store.update(chat_id, apply, {"state": state, "data": {}})
 
 def process_flow(chat_id, text):
     """
@@ -51,7 +35,7 @@ def process_flow(chat_id, text):
     data = user_info.get("data", {})
     
     # Extract phone from chat_id for database lookup
-    phone = chat_id.split("@")[0] if "@" in chat_id else chat_id
+    phone = canonical_phone(chat_id)
     db_user = database.get_user_by_phone(phone)
 
     # Reset flow if user says "reset" or "restart"
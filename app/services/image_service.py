@@ -0,0 +1,122 @@
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.services.openai_service import generate_image
+
+# DALL·E images are generated off the chat queue: the handler replies right away and the
+# image is sent by a callback once ready. Results are kept in a content-addressed cache
+# (sha256 of the normalized prompt + settings) and concurrent identical prompts share one call.
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "generated_images")
+IMAGE_CACHE_MAX_FILES = int(os.getenv("IMAGE_CACHE_MAX_FILES", "200"))
+IMAGE_SETTINGS = "dall-e-3|1024x1024|standard"
+
+_executor = None
+_lock = threading.Lock()
+_inflight = {}  # key -> Future
+_stats = {"requests": 0, "generated": 0, "cache_hits": 0, "deduplicated": 0, "failures": 0, "generation_seconds": 0.0}
+
+def image_key(prompt):
+    normalized = " ".join(prompt.lower().split())
+    return hashlib.sha256(f"{IMAGE_SETTINGS}|{normalized}".encode("utf-8")).hexdigest()
+
+def _cache_path(key):
+    return os.path.join(IMAGE_CACHE_DIR, f"{key}.png")
+
+def _read_cache(key):
+    try:
+        with open(_cache_path(key), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_cache(key, image_bytes):
+    try:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_cache_path(key)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, _cache_path(key))
+        _prune_cache()
+    except OSError as e:
+        print(f"⚠️ [IMAGES] Could not cache image {key[:12]}: {e}")
+
+def _prune_cache():
+    files = [entry for entry in os.scandir(IMAGE_CACHE_DIR) if entry.name.endswith(".png")]
+    if len(files) <= IMAGE_CACHE_MAX_FILES:
+        return
+    files.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in files[:len(files) - IMAGE_CACHE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="dalle")
+    return _executor
+
+def _generate(key, prompt):
+    started = time.time()
+    try:
+        image_bytes = generate_image(prompt)
+        with _lock:
+            if image_bytes:
+                _stats["generated"] += 1
+                _stats["generation_seconds"] += time.time() - started
+            else:
+                _stats["failures"] += 1
+        if image_bytes:
+            _write_cache(key, image_bytes)
+        return image_bytes
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+def _deliver(callback, image_bytes):
+    try:
+        callback(image_bytes)
+    except Exception as e:
+        print(f"❌ [IMAGES] Error delivering image: {e}")
+
+def request_image(prompt, callback):
+    """
+    Generates the image for prompt in the background and calls callback(image_bytes or None).
+    Never blocks on the API: cached images are delivered at once, identical prompts
+    already being generated just wait for the same result.
+    """
+    key = image_key(prompt)
+    with _lock:
+        _stats["requests"] += 1
+    cached = _read_cache(key)
+    if cached:
+        with _lock:
+            _stats["cache_hits"] += 1
+        print(f"⚡ [IMAGES] Cache hit for prompt {key[:12]}")
+        _deliver(callback, cached)
+        return
+
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            _stats["deduplicated"] += 1
+        else:
+            future = _inflight[key] = _get_executor().submit(_generate, key, prompt)
+    future.add_done_callback(lambda f: _deliver(callback, None if f.exception() else f.result()))
+
+def get_image_generation_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["in_flight"] = len(_inflight)
+    stats["avg_generation_seconds"] = stats["generation_seconds"] / stats["generated"] if stats["generated"] else 0.0
+    return stats
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
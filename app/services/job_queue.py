@@ -0,0 +1,298 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from psycopg2.extras import Json
+from app.services import database
+
+# Durable background jobs stored in the PostgreSQL 'jobs' table (created by database.init_db).
+# Workers run inside this process; if the database is unreachable when a job is enqueued
+# it is kept in memory instead so the side effect still happens (best effort, not durable).
+
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "5"))
+BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "600"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# 'done' rows are only kept for inspection: deleted RETENTION_DAYS after they finished
+RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+PURGE_INTERVAL = float(os.getenv("JOB_PURGE_INTERVAL", "3600"))
+
+_handlers = {}  # kind -> callable(payload) -> bool or Future[bool]
+_workers = []
+_stop = threading.Event()
+_wake = threading.Event()
+
+# In-memory fallback queue: heap of (run_at, seq, job)
+_memory_jobs = []
+_memory_lock = threading.Lock()
+_memory_seq = itertools.count(1)
+_memory_failed = []
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+def register(kind, handler):
+    """
+    Registers the handler for a job kind.
+    The handler receives the payload dict and must return True on success.
+    Returning False or raising schedules a retry with exponential backoff.
+    A handler that hands the work to another queue may return a Future instead: the worker
+    moves on at once and the job stays 'running' until the future resolves to its result.
+    """
+    _handlers[kind] = handler
+
+def backoff_delay(attempts):
+    """Seconds to wait before the next attempt (exponential with full jitter)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return random.uniform(delay / 2, delay)
+
+def enqueue(kind, payload, max_attempts=None):
+    """Persists a job and wakes the workers. Returns the job id (None if kept in memory)."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    max_attempts = max_attempts or DEFAULT_MAX_ATTEMPTS
+
+    try:
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO jobs (kind, payload, max_attempts) VALUES (%s, %s, %s) RETURNING id",
+                (kind, Json(payload), max_attempts)
+            )
+            job_id = cursor.fetchone()['id']
+            conn.commit()
+            cursor.close()
+        print(f"📥 [JOBS] Job {job_id} ({kind}) enfileirado")
+        _wake.set()
+        return job_id
+    except Exception as e:
+        print(f"⚠️ [JOBS] Could not persist job '{kind}', keeping it in memory: {e}")
+        job = {
+            "id": f"mem-{next(_memory_seq)}",
+            "kind": kind,
+            "payload": payload,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+        }
+        with _memory_lock:
+            heapq.heappush(_memory_jobs, (time.time(), next(_memory_seq), job))
+        _wake.set()
+        return None
+
+async def enqueue_async(kind, payload, max_attempts=None):
+    """Same as enqueue(), without blocking the event loop."""
+    return await asyncio.to_thread(enqueue, kind, payload, max_attempts)
+
+def _claim_memory_job():
+    with _memory_lock:
+        if _memory_jobs and _memory_jobs[0][0] <= time.time():
+            job = heapq.heappop(_memory_jobs)[2]
+            job["attempts"] += 1
+            return job
+    return None
+
+def _claim_db_job():
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE status = 'pending' AND run_at <= CURRENT_TIMESTAMP
+                ORDER BY run_at, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts, max_attempts
+        """)
+        job = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+    return job
+
+def _finish_db_job(job, ok, error):
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        if ok:
+            cursor.execute(
+                "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                (job["id"],)
+            )
+        elif job["attempts"] >= job["max_attempts"]:
+            cursor.execute(
+                "UPDATE jobs SET status = 'failed', last_error = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                (error, job["id"])
+            )
+        else:
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'pending', last_error = %s, updated_at = CURRENT_TIMESTAMP,
+                    run_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE id = %s
+            """, (error, backoff_delay(job["attempts"]), job["id"]))
+        conn.commit()
+        cursor.close()
+
+def _finish_memory_job(job, ok, error):
+    if ok:
+        return
+    job["last_error"] = error
+    with _memory_lock:
+        if job["attempts"] >= job["max_attempts"]:
+            _memory_failed.append(job)
+            del _memory_failed[:-50]
+        else:
+            run_at = time.time() + backoff_delay(job["attempts"])
+            heapq.heappush(_memory_jobs, (run_at, next(_memory_seq), job))
+
+def _settle(job, from_memory, ok, error):
+    status = "✅ ok" if ok else f"❌ falhou ({error})"
+    print(f"⚙️ [JOBS] Job {job['id']} ({job['kind']}) tentativa {job['attempts']}/{job['max_attempts']}: {status}")
+    try:
+        if from_memory:
+            _finish_memory_job(job, ok, error)
+        else:
+            _finish_db_job(job, ok, error)
+    except Exception as e:
+        print(f"⚠️ [JOBS] Error recording result of job {job['id']}: {e}")
+
+def _outcome(result):
+    return (True, None) if result else (False, "Handler returned failure")
+
+def _settle_future(job, from_memory, future):
+    error = future.exception()
+    if error is not None:
+        _settle(job, from_memory, False, f"{type(error).__name__}: {error}")
+    else:
+        _settle(job, from_memory, *_outcome(future.result()))
+
+def _run_job(job, from_memory):
+    handler = _handlers.get(job["kind"])
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind '{job['kind']}'")
+        result = handler(job["payload"])
+    except Exception as e:
+        traceback.print_exc()
+        _settle(job, from_memory, False, f"{type(e).__name__}: {e}")
+        return
+
+    if isinstance(result, Future):
+        # Settled by whichever thread resolves the future; this worker is free for the next job
+        result.add_done_callback(lambda future: _settle_future(job, from_memory, future))
+    else:
+        _settle(job, from_memory, *_outcome(result))
+
+def _purge_done_jobs():
+    """Deletes old 'done' jobs; runs in one idle worker at most every PURGE_INTERVAL seconds."""
+    global _last_purge
+    if RETENTION_DAYS <= 0 or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        if time.time() - _last_purge < PURGE_INTERVAL:
+            return
+        _last_purge = time.time()
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'",
+                (RETENTION_DAYS,)
+            )
+            if cursor.rowcount:
+                print(f"🧹 [JOBS] {cursor.rowcount} job(s) concluído(s) há mais de {RETENTION_DAYS:g} dia(s) removido(s)")
+            conn.commit()
+            cursor.close()
+    except Exception as e:
+        print(f"⚠️ [JOBS] Could not purge finished jobs: {e}")
+    finally:
+        _purge_lock.release()
+
+def _worker_loop():
+    while not _stop.is_set():
+        job, from_memory = _claim_memory_job(), True
+        if job is None:
+            from_memory = False
+            try:
+                job = _claim_db_job()
+            except Exception as e:
+                print(f"⚠️ [JOBS] Error claiming job: {e}")
+                job = None
+
+        if job is None:
+            _purge_done_jobs()
+            _wake.wait(POLL_INTERVAL)
+            _wake.clear()
+            continue
+
+        _run_job(job, from_memory)
+
+def _requeue_interrupted_jobs():
+    # Single-replica deployment: anything still 'running' was interrupted by a restart
+    try:
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE jobs SET status = 'pending', updated_at = CURRENT_TIMESTAMP WHERE status = 'running'")
+            if cursor.rowcount:
+                print(f"🔁 [JOBS] {cursor.rowcount} job(s) interrompido(s) voltaram para a fila")
+            conn.commit()
+            cursor.close()
+    except Exception as e:
+        print(f"⚠️ [JOBS] Could not requeue interrupted jobs: {e}")
+
+def start(workers=None):
+    """Starts the worker threads (idempotent)."""
+    if _workers:
+        return
+    workers = workers or int(os.getenv("JOB_WORKERS", "3"))
+    _stop.clear()
+    _requeue_interrupted_jobs()
+    for i in range(workers):
+        thread = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+    print(f"⚙️ [JOBS] {workers} worker(s) iniciados")
+
+def stop(timeout=10):
+    """Signals the workers to stop and waits for in-flight jobs to finish."""
+    _stop.set()
+    _wake.set()
+    deadline = time.time() + timeout
+    for thread in _workers:
+        thread.join(max(0, deadline - time.time()))
+    _workers.clear()
+
+def get_job_stats(limit=50):
+    """Counts per status plus the most recent pending/running/failed jobs."""
+    with _memory_lock:
+        memory = {
+            "pending": len(_memory_jobs),
+            "failed": [
+                {"id": j["id"], "kind": j["kind"], "attempts": j["attempts"], "last_error": j.get("last_error")}
+                for j in _memory_failed
+            ],
+        }
+
+    stats = {"counts": {}, "jobs": [], "memory": memory}
+    try:
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status")
+            stats["counts"] = {row['status']: row['total'] for row in cursor.fetchall()}
+            cursor.execute("""
+                SELECT id, kind, status, attempts, max_attempts, last_error, run_at, created_at, updated_at
+                FROM jobs
+                WHERE status IN ('pending', 'running', 'failed')
+                ORDER BY updated_at DESC
+                LIMIT %s
+            """, (limit,))
+            stats["jobs"] = cursor.fetchall()
+            cursor.close()
+    except Exception as e:
+        stats["error"] = str(e)
+    return stats
@@ -0,0 +1,110 @@
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class QueueFull(Exception):
+    """Raised by submit() when the dispatcher cannot accept more work in time."""
+
+class ChatDispatcher:
+    """
+    Runs tasks on a bounded worker pool while keeping strict ordering per chat.
+
+    Each chat has its own FIFO queue and at most one task of a chat runs at a time.
+    Workers process one task and re-schedule the chat at the back of the executor
+    queue, so a busy chat cannot starve the others (round-robin between chats).
+    submit() blocks the caller when the chat queue or the global backlog is full.
+    """
+
+    def __init__(self, max_workers=8, max_queue_per_chat=20, max_pending=500, submit_timeout=5.0):
+        self.max_workers = max_workers
+        self.max_queue_per_chat = max_queue_per_chat
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chat-worker")
+        self._queues = {}  # chat_id -> deque of (func, args, enqueued_at)
+        self._active = set()  # chats currently scheduled on the executor
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0,
+        }
+
+    def submit(self, chat_id, func, *args):
+        """Queues func(*args) behind the previous tasks of chat_id. Raises QueueFull on timeout."""
+        deadline = time.monotonic() + self.submit_timeout
+
+        with self._cond:
+            while (self._pending >= self.max_pending
+                   or len(self._queues.get(chat_id, ())) >= self.max_queue_per_chat):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["rejected"] += 1
+                    raise QueueFull(f"Dispatcher queue full for {chat_id}")
+                self._cond.wait(remaining)
+
+            self._queues.setdefault(chat_id, deque()).append((func, args, time.monotonic()))
+            self._pending += 1
+            self._stats["submitted"] += 1
+
+            schedule = chat_id not in self._active
+            if schedule:
+                self._active.add(chat_id)
+
+        if schedule:
+            self._executor.submit(self._run_next, chat_id)
+
+    def _run_next(self, chat_id):
+        with self._cond:
+            func, args, enqueued_at = self._queues[chat_id].popleft()
+            waited = time.monotonic() - enqueued_at
+            self._stats["queue_wait_total"] += waited
+            self._stats["queue_wait_max"] = max(self._stats["queue_wait_max"], waited)
+
+        failed = False
+        try:
+            func(*args)
+        except Exception:
+            failed = True
+            traceback.print_exc()
+
+        with self._cond:
+            self._pending -= 1
+            self._stats["processed"] += 1
+            if failed:
+                self._stats["failed"] += 1
+
+            if self._queues[chat_id]:
+                reschedule = True
+            else:
+                del self._queues[chat_id]
+                self._active.discard(chat_id)
+                reschedule = False
+            self._cond.notify_all()
+
+        if reschedule:
+            self._executor.submit(self._run_next, chat_id)
+
+    def stats(self, top=20):
+        """Global counters plus queue depth of the busiest chats."""
+        with self._cond:
+            stats = dict(self._stats)
+            depths = {chat_id: len(q) for chat_id, q in self._queues.items()}
+            stats["pending"] = self._pending
+            stats["active_chats"] = len(self._active)
+
+        processed = stats["processed"]
+        stats["queue_wait_avg"] = stats["queue_wait_total"] / processed if processed else 0.0
+        stats["max_workers"] = self.max_workers
+        stats["chat_queue_depth"] = dict(sorted(depths.items(), key=lambda item: item[1], reverse=True)[:top])
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,290 @@
+import os
+import time
+import queue
+import random
+import asyncio
+import threading
+
+# Resilient access to the OpenAI API shared by every caller in the process:
+# AsyncOpenAI running on a dedicated event-loop thread, with a global concurrency limit,
+# token-bucket rate limiting, jittered exponential backoff on 429/5xx/timeouts,
+# per-call timeouts, a circuit breaker per call kind and latency histograms.
+
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_RPM", "500"))
+BURST = int(os.getenv("OPENAI_BURST", "20"))
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "20"))
+BREAKER_THRESHOLD = int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("OPENAI_BREAKER_RESET", "30"))
+TIMEOUTS = {
+    "chat": float(os.getenv("OPENAI_TIMEOUT_CHAT", "60")),
+    "whisper": float(os.getenv("OPENAI_TIMEOUT_WHISPER", "60")),
+    "images": float(os.getenv("OPENAI_TIMEOUT_IMAGES", "120")),
+}
+# Longest wait for the next delta of a streamed answer
+STREAM_READ_TIMEOUT = float(os.getenv("OPENAI_STREAM_READ_TIMEOUT", "30"))
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit breaker of a call kind is open."""
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, up to ``capacity`` stored."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive failures. After ``reset_after`` seconds it lets a
+    single trial call through (other calls are still rejected): success closes it, failure
+    opens it again. Only used from the client's event loop thread, so no locking.
+    """
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def check(self, kind):
+        """Raises CircuitOpenError unless the call may go through (claims the trial when half-open)."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitOpenError(f"OpenAI '{kind}' circuit open after {self.failures} consecutive failures")
+        if state == "half_open":
+            self._trial_in_flight = True
+
+    def release(self):
+        """The call ended without telling whether the API is healthy (cancelled, client error)."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        # A failed trial re-opens the breaker for another reset period
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+class LatencyHistogram:
+    BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, float("inf"))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.total = 0
+        self.errors = 0
+        self.sum = 0.0
+
+    def observe(self, seconds, ok=True):
+        self.total += 1
+        self.sum += seconds
+        if not ok:
+            self.errors += 1
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def snapshot(self):
+        return {
+            "count": self.total,
+            "errors": self.errors,
+            "avg_seconds": self.sum / self.total if self.total else 0.0,
+            "buckets": {("+Inf" if bound == float("inf") else f"<={bound}s"): count
+                        for bound, count in zip(self.BUCKETS, self.counts)},
+        }
+
+def _is_retryable(error):
+    import openai
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except Exception:
+        return None
+
+class ResilientOpenAI:
+    def __init__(self):
+        self._client = None
+        self._loop = None
+        self._loop_ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._semaphore = None
+        self._bucket = None
+        self._breakers = {kind: CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET) for kind in TIMEOUTS}
+        self._histograms = {kind: LatencyHistogram() for kind in (*TIMEOUTS, "chat_stream")}
+        self._retries = {kind: 0 for kind in TIMEOUTS}
+
+    # --- event loop thread ---
+
+    def _ensure_loop(self):
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                threading.Thread(target=self._run_loop, name="openai-loop", daemon=True).start()
+                self._loop_ready.wait()
+        return self._loop
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        self._bucket = TokenBucket(REQUESTS_PER_MINUTE / 60.0, BURST)
+        self._loop = loop
+        self._loop_ready.set()
+        loop.run_forever()
+
+    def run_sync(self, coro):
+        """Runs a coroutine of this client from synchronous code and returns its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def iter_sync(self, agen):
+        """Iterates an async generator of this client from synchronous code."""
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+            finally:
+                items.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    # --- calls ---
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Retries are handled here (with the rate limiter and breaker), not by the SDK.
+            # The SDK timeout (default 600s) is only a backstop for the waits below.
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0,
+                                       timeout=max(TIMEOUTS.values()))
+        return self._client
+
+    async def _backoff(self, kind, attempt, error):
+        self._retries[kind] += 1
+        delay = _retry_after(error) or min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)
+        print(f"🔁 [OPENAI] {kind} failed ({type(error).__name__}), retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def _call(self, kind, request):
+        """request(client) -> awaitable. Applies limits, timeout, retries and breaker."""
+        breaker = self._breakers[kind]
+        for attempt in range(MAX_RETRIES + 1):
+            breaker.check(kind)
+            try:
+                await self._bucket.acquire()
+                async with self._semaphore:
+                    started = time.monotonic()
+                    try:
+                        result = await asyncio.wait_for(request(self._get_client()), TIMEOUTS[kind])
+                    except Exception as e:
+                        self._histograms[kind].observe(time.monotonic() - started, ok=False)
+                        if not _is_retryable(e):
+                            raise
+                        if attempt == MAX_RETRIES:
+                            # One failure per logical call, however many attempts it took
+                            breaker.record_failure()
+                            raise
+                        error = e
+                    else:
+                        self._histograms[kind].observe(time.monotonic() - started)
+                        breaker.record_success()
+                        return result
+            except BaseException:
+                # Cancelled or non-retryable error: free a claimed half-open trial
+                breaker.release()
+                raise
+            # Give back a half-open trial while backing off; the next attempt claims it again
+            breaker.release()
+            await self._backoff(kind, attempt, error)
+
+    async def chat(self, **kwargs):
+        return await self._call("chat", lambda client: client.chat.completions.create(**kwargs))
+
+    async def chat_stream(self, **kwargs):
+        """
+        Yields text deltas. Retries only happen before the first delta was produced; a stream
+        that stalls for STREAM_READ_TIMEOUT seconds between deltas fails with a TimeoutError.
+        """
+        stream = await self._call("chat", lambda client: client.chat.completions.create(stream=True, **kwargs))
+        started = time.monotonic()
+        events = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), STREAM_READ_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        except Exception:
+            self._breakers["chat"].record_failure()
+            await stream.close()
+            raise
+        finally:
+            # Time to read the stream (time to first token is in the 'chat' histogram)
+            self._histograms["chat_stream"].observe(time.monotonic() - started)
+
+    async def transcribe(self, **kwargs):
+        return await self._call("whisper", lambda client: client.audio.transcriptions.create(**kwargs))
+
+    async def image(self, **kwargs):
+        return await self._call("images", lambda client: client.images.generate(**kwargs))
+
+    def stats(self):
+        return {
+            kind: {
+                **histogram.snapshot(),
+                "retries": self._retries.get(kind, 0),
+                "breaker": self._breakers[kind].state if kind in self._breakers else None,
+            }
+            for kind, histogram in self._histograms.items()
+        }
+
+client = ResilientOpenAI()
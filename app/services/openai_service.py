@@ -1,18 +1,36 @@
 import os
 import sys
-import tempfile
 import base64
+import threading
+import hashlib
 import requests
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# All API calls go through the shared async client (concurrency/rate limits, retries,
+# timeouts, circuit breaker); the SDK itself is only imported on first use
+from app.services.openai_client import client as openai_client
+from app.utils.audio import preprocess_audio
 
-def get_system_prompt():
-    prompt_file = os.getenv("SYSTEM_PROMPT_FILE") or "system_prompt.txt"
-    
+def get_openai_stats():
+    return openai_client.stats()
+
+ERROR_REPLY = "Desculpe, tive um erro ao processar sua mensagem."
+
+# System prompt cache: reloaded only when the file's mtime/inode/size change
+_prompt_lock = threading.Lock()
+_prompt_cache = {"key": None, "template": None, "version": None}
+
+def _prompt_source_key(prompt_file):
+    try:
+        st = os.stat(prompt_file)
+        return (prompt_file, st.st_mtime_ns, st.st_ino, st.st_size)
+    except OSError:
+        # No file: the prompt comes from the environment
+        return (prompt_file, None, os.getenv("SYSTEM_PROMPT"))
+
+def _read_system_prompt(prompt_file):
     # Priority 1: Read from file if it exists
     if os.path.exists(prompt_file):
         try:
@@ -27,62 +45,124 @@ def get_system_prompt():
     # Priority 3: Default fallback
     return os.getenv("SYSTEM_PROMPT") or "Você é um assistente útil e amigável."
 
-def generate_response(messages):
+def get_system_prompt_template():
+    """The raw system prompt (with its {user_name} placeholder), cached until the file changes."""
+    prompt_file = os.getenv("SYSTEM_PROMPT_FILE") or "system_prompt.txt"
+    key = _prompt_source_key(prompt_file)
+    if key == _prompt_cache["key"]:
+        return _prompt_cache["template"]
+
+    with _prompt_lock:
+        if key != _prompt_cache["key"]:
+            template = _read_system_prompt(prompt_file)
+            _prompt_cache["template"] = template
+            _prompt_cache["version"] = hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+            _prompt_cache["key"] = key
+            print(f"📝 System prompt (re)loaded from {prompt_file} (version {_prompt_cache['version']})")
+    return _prompt_cache["template"]
+
+def get_system_prompt_version():
+    """Short hash of the current system prompt (changes whenever the prompt changes)."""
+    get_system_prompt_template()
+    return _prompt_cache["version"]
+
+def get_system_prompt(user_name=None):
+    """System prompt with {user_name} rendered (str.replace: the prompt may contain other braces)."""
+    return get_system_prompt_template().replace("{user_name}", user_name or "cliente")
+
+def build_prompt_messages(messages, user_name=None):
+    """
+    Prepends the system prompt to the chat messages.
+
+    The first message is the prompt template verbatim, byte-identical for every user and
+    call, so OpenAI's automatic prompt caching can reuse it. Per-user values go in a
+    second, small system message instead of being rendered into the template.
+    """
+    api_messages = [{"role": "system", "content": get_system_prompt_template()}]
+    if user_name:
+        api_messages.append({"role": "system", "content": f"O nome do cliente ({{user_name}}) é: {user_name}"})
+    return api_messages + messages
+
+def generate_response(messages, user_name=None):
     try:
-        system_prompt = get_system_prompt()
-        
         # Prepare messages for OpenAI
-        api_messages = [{"role": "system", "content": system_prompt}] + messages
+        api_messages = build_prompt_messages(messages, user_name)
         
-        response = client.chat.completions.create(
+        response = openai_client.run_sync(openai_client.chat(
             model="gpt-4o-mini", # Cheaper model with Vision support
             messages=api_messages
-        )
+        ))
         
         return response.choices[0].message.content
     except Exception as e:
         print(f"OpenAI API Error: {e}")
-        return "Desculpe, tive um erro ao processar sua mensagem."
+        return ERROR_REPLY
 
-def transcribe_audio(audio_bytes):
+def generate_response_stream(messages, user_name=None):
+    """
+    Same as generate_response, but yields the answer as it is generated (text deltas).
+    On error yields the usual apology if nothing was produced yet.
+    """
+    produced = False
     try:
-        # Save bytes to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".ogg") as temp_audio:
-            temp_audio.write(audio_bytes)
-            temp_path = temp_audio.name
-            
-        try:
-            with open(temp_path, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-            return transcript.text
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
+        stream = openai_client.iter_sync(openai_client.chat_stream(
+            model="gpt-4o-mini",
+            messages=build_prompt_messages(messages, user_name)
+        ))
+        for delta in stream:
+            produced = True
+            yield delta
+    except Exception as e:
+        print(f"OpenAI API Error (stream): {e}")
+        if not produced:
+            yield ERROR_REPLY
+
+def transcribe_audio(audio_bytes, mimetype=None):
+    try:
+        # Uploaded straight from memory as a named (filename, bytes) file, no temp file
+        audio_bytes, filename = preprocess_audio(audio_bytes, mimetype)
+        transcript = openai_client.run_sync(openai_client.transcribe(
+            model="whisper-1",
+            file=(filename, audio_bytes)
+        ))
+        return transcript.text
     except Exception as e:
         print(f"Transcription Error: {e}")
         return None
 
+# Keep-alive connection pool for downloading generated images from the OpenAI CDN
+IMAGE_DOWNLOAD_TIMEOUT = (float(os.getenv("IMAGE_CONNECT_TIMEOUT", "5")), float(os.getenv("IMAGE_READ_TIMEOUT", "30")))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+_http = requests.Session()
+_http.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+def download_image(url):
+    """Streams the image into memory (bounded by IMAGE_MAX_BYTES). Returns bytes or None."""
+    with _http.get(url, stream=True, timeout=IMAGE_DOWNLOAD_TIMEOUT) as response:
+        if response.status_code != 200:
+            print(f"Image download failed: HTTP {response.status_code}")
+            return None
+        buffer = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            buffer.extend(chunk)
+            if len(buffer) > IMAGE_MAX_BYTES:
+                print(f"Image download aborted: larger than {IMAGE_MAX_BYTES} bytes")
+                return None
+        return bytes(buffer)
+
 def generate_image(prompt):
     try:
-        response = client.images.generate(
+        response = openai_client.run_sync(openai_client.image(
             model="dall-e-3",
             prompt=prompt,
             size="1024x1024",
             quality="standard",
             n=1,
-        )
+        ))
         
         image_url = response.data[0].url
         # Download the image
-        img_response = requests.get(image_url)
-        if img_response.status_code == 200:
-            return img_response.content
-        return None
+        return download_image(image_url)
     except Exception as e:
         print(f"Image Generation Error: {e}")
         return None
@@ -0,0 +1,148 @@
+import heapq
+import random
+import threading
+import time
+import uuid
+from app.utils.state_store import StateStore
+
+class TokenBucket:
+    """Blocking token bucket: ``rate`` sends per second with bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class OutboundQueue:
+    """
+    Outbound message queue with a single sender thread.
+
+    Every message is written to a StateStore before enqueue() returns and removed once
+    sent, so messages queued while the client is disconnected (or when the process
+    restarts) are replayed after the next connect. Sends are throttled by a token bucket;
+    failures are retried with jittered exponential backoff up to ``max_attempts`` times.
+    """
+
+    def __init__(self, send, path, rate=1.0, burst=5, max_attempts=5, backoff_base=2.0, backoff_max=120.0):
+        self.send = send  # send(to, text) -> True, raises (or returns False) on failure
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._store = StateStore(path)
+        self._bucket = TokenBucket(rate, burst)
+        self._heap = []  # (ready_at, seq, message_id)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._connected = False
+        self._thread = None
+        self._stats = {"enqueued": 0, "sent": 0, "failed": 0, "retries": 0, "replayed": 0,
+                       "queue_seconds": 0.0, "max_queue_seconds": 0.0, "send_seconds": 0.0}
+
+        # Messages left over from a previous run are sent after the first connect
+        for message_id, _ in sorted(self._store.items(), key=lambda item: item[1]["enqueued_at"]):
+            self._push(message_id, 0)
+            self._stats["replayed"] += 1
+        if self._heap:
+            print(f"📨 [OUTBOX] {len(self._heap)} pending message(s) restored, waiting for connection")
+
+    def _push(self, message_id, ready_at):
+        self._seq += 1
+        heapq.heappush(self._heap, (ready_at, self._seq, message_id))
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="whatsapp-outbox", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, to, text):
+        """Persists the message and schedules it. Returns its id."""
+        message_id = uuid.uuid4().hex
+        self._store.set(message_id, {"to": to, "text": text, "attempts": 0, "enqueued_at": time.time()})
+        with self._cond:
+            self._push(message_id, 0)
+            self._stats["enqueued"] += 1
+            self._cond.notify()
+        self.start()
+        return message_id
+
+    def set_connected(self, connected):
+        with self._cond:
+            self._connected = connected
+            if connected and self._heap:
+                print(f"📨 [OUTBOX] Connected, sending {len(self._heap)} queued message(s)")
+            self._cond.notify()
+        self.start()
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._connected and self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        return heapq.heappop(self._heap)[2]
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _worker(self):
+        while True:
+            message_id = self._next()
+            message = self._store.get(message_id)
+            if message is None:
+                continue
+
+            self._bucket.acquire()
+            started = time.monotonic()
+            try:
+                ok = self.send(message["to"], message["text"])
+            except Exception as e:
+                print(f"⚠️ [OUTBOX] Send to {message['to']} failed: {e}")
+                ok = False
+            elapsed = time.monotonic() - started
+
+            with self._cond:
+                self._stats["send_seconds"] += elapsed
+                if ok:
+                    self._store.delete(message_id)
+                    queued = time.time() - message["enqueued_at"]
+                    self._stats["sent"] += 1
+                    self._stats["queue_seconds"] += queued
+                    self._stats["max_queue_seconds"] = max(self._stats["max_queue_seconds"], queued)
+                    continue
+
+                attempts = message["attempts"] + 1
+                if attempts >= self.max_attempts:
+                    self._store.delete(message_id)
+                    self._stats["failed"] += 1
+                    print(f"❌ [OUTBOX] Giving up on message to {message['to']} after {attempts} attempts")
+                    continue
+                self._store.set(message_id, {**message, "attempts": attempts})
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+                self._push(message_id, time.monotonic() + random.uniform(delay / 2, delay))
+                self._stats["retries"] += 1
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["depth"] = len(self._heap)
+            stats["connected"] = self._connected
+        attempts = stats["sent"] + stats["failed"] + stats["retries"]
+        stats["avg_queue_seconds"] = stats["queue_seconds"] / stats["sent"] if stats["sent"] else 0.0
+        stats["avg_send_seconds"] = stats["send_seconds"] / attempts if attempts else 0.0
+        return stats
@@ -0,0 +1,62 @@
+import re
+import time
+
+# Paragraph breaks are preferred over sentence ends, which are preferred over line breaks
+_BOUNDARIES = [
+    re.compile(r"\n\s*\n"),
+    re.compile(r"[.!?…](?:[*_~)\"'»]*)\s+"),
+    re.compile(r"\n"),
+]
+
+class ResponseChunker:
+    """
+    Turns a stream of small text deltas into WhatsApp-sized messages.
+
+    A chunk is released at a paragraph or sentence boundary once it has at least
+    ``min_chars`` characters. After the first chunk, text keeps accumulating for
+    ``coalesce_window`` seconds so a fast stream does not become a burst of tiny
+    messages. Text without any boundary is cut at a space after ``max_chars``.
+    """
+
+    def __init__(self, min_chars=80, max_chars=1500, coalesce_window=1.5, clock=time.monotonic):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.coalesce_window = coalesce_window
+        self.clock = clock
+        self._buffer = ""
+        self._last_emit = None
+
+    def _split_point(self):
+        for pattern in _BOUNDARIES:
+            ends = [m.end() for m in pattern.finditer(self._buffer) if m.end() >= self.min_chars]
+            if ends:
+                return ends[-1]
+        return None
+
+    def feed(self, delta):
+        """Adds streamed text; returns the list of chunks ready to be sent (possibly empty)."""
+        self._buffer += delta
+
+        if len(self._buffer) >= self.max_chars:
+            cut = self._split_point() or self._buffer.rfind(" ", 0, self.max_chars) + 1 or self.max_chars
+            chunk = self._emit(cut)
+            return [chunk] if chunk else []
+
+        if self._last_emit is not None and self.clock() - self._last_emit < self.coalesce_window:
+            return []
+
+        cut = self._split_point()
+        chunk = self._emit(cut) if cut else None
+        return [chunk] if chunk else []
+
+    def flush(self):
+        """Returns whatever is left at the end of the stream (None if nothing)."""
+        if not self._buffer.strip():
+            self._buffer = ""
+            return None
+        return self._emit(len(self._buffer))
+
+    def _emit(self, cut):
+        chunk, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        self._last_emit = self.clock()
+        return chunk.strip()
@@ -2,13 +2,19 @@ import os
 import time
 import base64
 from neonize.client import NewClient
-from neonize.events import MessageEv, ReceiptEv
-from neonize.utils.jid import Jid2String, JID
+from neonize.events import MessageEv, ReceiptEv, ConnectedEv, DisconnectedEv, LoggedOutEv
 from neonize.utils.enum import ChatPresence, ChatPresenceMedia
-from app.services.openai_service import generate_response, transcribe_audio, generate_image
+from app.services.openai_service import generate_response, generate_response_stream, transcribe_audio, get_system_prompt_version, ERROR_REPLY
 from app.utils.script_runner import run_script
+from app.utils.image_prep import prepare_image
+from app.utils.jid import canonical_phone, normalize_jid, to_jid, jid_to_str
 from app.services.flow_service import process_flow
-from app.services import database
+from app.services import database, image_service
+from app.services.message_dispatcher import ChatDispatcher, QueueFull
+from app.services.conversation_memory import ConversationMemory
+from app.services.response_chunker import ResponseChunker
+from app.services.answer_cache import AnswerCache
+from app.services.outbound_queue import OutboundQueue
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,47 +22,70 @@ load_dotenv()
 # Global client to be accessed by other services (like webhooks)
 whatsapp_client = None
 latest_qr_data = None
-conversation_history = {}
 registration_state = {}  # Track users in registration process
-MAX_HISTORY = 10
+
+# Per-chat history sent to OpenAI, bounded by a token budget (old turns are summarized)
+conversation_memory = ConversationMemory(
+    token_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "3000")),
+    max_messages=int(os.getenv("CONVERSATION_MAX_MESSAGES", "40")),
+    ttl=float(os.getenv("CONVERSATION_TTL", "3600")),
+)
+
+# Incoming messages run on a worker pool, one at a time per chat (keeps replies in order)
+dispatcher = ChatDispatcher(
+    max_workers=int(os.getenv("CHAT_WORKERS", "8")),
+    max_queue_per_chat=int(os.getenv("CHAT_MAX_QUEUE", "20")),
+    max_pending=int(os.getenv("CHAT_MAX_PENDING", "500")),
+    submit_timeout=float(os.getenv("CHAT_SUBMIT_TIMEOUT", "5")),
+)
+
+# Send long answers in sentence/paragraph chunks while they are generated
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1") != "0"
+STREAM_MIN_CHUNK_CHARS = int(os.getenv("STREAM_MIN_CHUNK_CHARS", "80"))
+STREAM_COALESCE_WINDOW = float(os.getenv("STREAM_COALESCE_WINDOW", "1.5"))
+
+# Answers to repeated questions (FAQ) are served locally, without calling OpenAI
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+answer_cache = AnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+)
+
+def get_outbox_stats():
+    """Returns outbound queue depth, latency and retry counters."""
+    return outbox.stats()
+
+def get_dispatcher_stats():
+    """Returns worker pool counters and per-chat queue depth."""
+    return dispatcher.stats()
+
+def get_answer_cache_stats():
+    """Returns FAQ answer cache counters (hit rate, seconds saved...)."""
+    return answer_cache.stats()
+
+def get_conversation_stats():
+    """Returns conversation memory counters (chats, messages, tokens, evictions)."""
+    return conversation_memory.stats()
 
 def send_whatsapp_message(jid_str: str, text: str):
     """
-    Sends a message to a specific JID. 
+    Queues a message to a specific JID. It is persisted and sent by the outbox worker
+    (rate limited, retried, replayed after reconnecting), so this never blocks.
     """
-    global whatsapp_client
+    jid_str = normalize_jid(jid_str)
+    outbox.enqueue(jid_str, text)
+    print(f"📨 Mensagem para {jid_str} adicionada à fila de envio")
+    return True
+
+def _send_now(jid_str: str, text: str):
+    """Sends a message to a specific JID right away (used by the outbox worker)."""
     if not whatsapp_client:
         print("❌ Erro: Cliente WhatsApp não inicializado.")
         return False
     
     try:
-        # Simple JID formatting if it's just a phone number
-        if "@" not in jid_str:
-            jid_str = jid_str.strip().replace("+", "").replace(" ", "")
-            jid_str = f"{jid_str}@s.whatsapp.net"
-            
-        # Parse JID components (protobuf JID requires all fields explicitly)
-        if "@" in jid_str:
-            user_part, server_part = jid_str.split("@")
-            target_jid = JID(
-                User=user_part, 
-                Server=server_part,
-                RawAgent=0,
-                Device=0,
-                Integrator=0,
-                IsEmpty=False
-            )
-        else:
-            # Fallback if split fails
-            target_jid = JID(
-                User=jid_str, 
-                Server="s.whatsapp.net",
-                RawAgent=0,
-                Device=0,
-                Integrator=0,
-                IsEmpty=False
-            )
-        
+        target_jid = to_jid(jid_str)
         whatsapp_client.send_message(to=target_jid, message=text)
         print(f"✅ Mensagem enviada para {jid_str}")
         return True
@@ -66,16 +95,67 @@ def send_whatsapp_message(jid_str: str, text: str):
         traceback.print_exc()
         return False
 
+# Outbound messages (form confirmations, notifications) go through a persistent,
+# rate-limited queue instead of being sent from the caller's thread
+outbox = OutboundQueue(
+    _send_now,
+    os.getenv("OUTBOUND_QUEUE_FILE", "outbound_queue.json"),
+    rate=float(os.getenv("WHATSAPP_SEND_RATE", "1")),
+    burst=int(os.getenv("WHATSAPP_SEND_BURST", "5")),
+    max_attempts=int(os.getenv("WHATSAPP_SEND_MAX_ATTEMPTS", "5")),
+)
+
+def send_reply(client: NewClient, message: MessageEv, text: str, quote: bool = True):
+    """Replies to the message (or sends a plain message to the chat), with direct send as fallback."""
+    # Some JIDs (@lid) work better with direct send_message
+    if quote:
+        try:
+            client.reply_message(text, message)
+            return
+        except Exception as e:
+            print(f"⚠️ Reply failed, attempting direct send: {e}")
+    client.send_message(to=message.Info.MessageSource.Chat, message=text)
+
+def stream_reply(client: NewClient, message: MessageEv, history, user_name=None):
+    """
+    Streams the GPT answer to the chat: the first chunk quotes the user's message,
+    the following ones are sent as plain messages. Returns the full answer text.
+    """
+    chunker = ResponseChunker(min_chars=STREAM_MIN_CHUNK_CHARS, coalesce_window=STREAM_COALESCE_WINDOW)
+    chat_jid = message.Info.MessageSource.Chat
+    parts = []
+    sent = 0
+
+    def send(chunk):
+        nonlocal sent
+        send_reply(client, message, chunk, quote=(sent == 0))
+        sent += 1
+        # Keep "typing..." visible while the rest is generated
+        client.send_chat_presence(chat_jid, ChatPresence.CHAT_PRESENCE_COMPOSING, ChatPresenceMedia.CHAT_PRESENCE_MEDIA_TEXT)
+
+    for delta in generate_response_stream(history, user_name=user_name):
+        parts.append(delta)
+        for chunk in chunker.feed(delta):
+            send(chunk)
+
+    rest = chunker.flush()
+    if rest:
+        send_reply(client, message, rest, quote=(sent == 0))
+        sent += 1
+
+    print(f"Streamed answer in {sent} message(s)")
+    return "".join(parts)
+
 def handle_message(client: NewClient, message: MessageEv):
     try:
         # Ignore messages from the bot itself
         if message.Info.MessageSource.IsFromMe:
             return
 
-        chat_id = Jid2String(message.Info.MessageSource.Chat)
+        chat_id = jid_to_str(message.Info.MessageSource.Chat)
         
         # Extract phone number from chat_id (format: 5544999849929@s.whatsapp.net)
-        phone = chat_id.split("@")[0] if "@" in chat_id else chat_id
+        phone = canonical_phone(chat_id)
         
         print(f"📩 [MSG] Processing message from: {chat_id} (Phone extracted: {phone})")
 
@@ -96,7 +176,8 @@ def handle_message(client: NewClient, message: MessageEv):
                 audio_bytes = client.download_any(message.Message)
                 if audio_bytes:
                     print(f"Audio downloaded successfully ({len(audio_bytes)} bytes). Transcribing...")
-                    text = transcribe_audio(audio_bytes)
+                    media = message.Message.audioMessage if message.Message.audioMessage else message.Message.documentMessage
+                    text = transcribe_audio(audio_bytes, media.mimetype)
                     if text:
                         print(f"Transcription result: '{text}'")
                         text = "!bot " + text
@@ -113,20 +194,17 @@ def handle_message(client: NewClient, message: MessageEv):
                 image_bytes = client.download_any(message.Message)
                 if image_bytes:
                     print(f"Image downloaded successfuly ({len(image_bytes)} bytes). Sending to Vision...")
+                    image_bytes, mimetype, detail = prepare_image(image_bytes)
                     b64_image = base64.b64encode(image_bytes).decode("utf-8")
                     
-                    if chat_id not in conversation_history:
-                        conversation_history[chat_id] = []
-                    
-                    history = conversation_history[chat_id]
-                    # Format for OpenAI Vision
-                    history.append({
+                    # Format for OpenAI Vision (the image is dropped from memory after its first use)
+                    conversation_memory.add(chat_id, {
                         "role": "user",
                         "content": [
                             {"type": "text", "text": f"!bot {caption}"},
                             {
                                 "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{b64_image}"}
+                                "image_url": {"url": f"data:{mimetype};base64,{b64_image}", "detail": detail}
                             }
                         ]
                     })
@@ -204,6 +282,7 @@ def handle_message(client: NewClient, message: MessageEv):
             return
         
         # Update last interaction for existing users
+        user_name = None
         if user:
             database.update_last_interaction(phone)
             # Add user name to conversation context for personalization
@@ -225,21 +304,26 @@ def handle_message(client: NewClient, message: MessageEv):
                 text = "!bot " + text
         
         if text.startswith("!bot "):
-            # Special case for images already in history
-            if "[IMAGEM]" in text:
-                prompt = text
-            else:
+            # Special case for images already in memory
+            is_image = "[IMAGEM]" in text
+            # Follow-ups depend on earlier turns: only opening questions use the answer cache
+            opening_question = not conversation_memory.has_history(chat_id)
+            if not is_image:
                 prompt = text[5:]
-                if chat_id not in conversation_history:
-                    conversation_history[chat_id] = []
-                history = conversation_history[chat_id]
-                history.append({"role": "user", "content": prompt})
+                conversation_memory.add(chat_id, {"role": "user", "content": prompt})
             
-            history = conversation_history[chat_id]
+            # Repeated questions (hours, payment, delivery...) are answered from the local cache
+            use_cache = ANSWER_CACHE_ENABLED and not is_image and opening_question
+            prompt_version = get_system_prompt_version() if use_cache else None
+            cached_answer = answer_cache.lookup(prompt, prompt_version) if use_cache else None
+            if cached_answer:
+                send_reply(client, message, cached_answer)
+                conversation_memory.add(chat_id, {"role": "assistant", "content": cached_answer})
+                print(f"Sent (cache): {cached_answer[:50]}...")
+                return
             
-            # Keep history small
-            if len(history) > MAX_HISTORY:
-                history.pop(0)
+            # Newest turns that fit in the token budget
+            history = conversation_memory.build_context(chat_id)
                 
             print(f"Generating response for {chat_id}...")
             
@@ -247,21 +331,19 @@ def handle_message(client: NewClient, message: MessageEv):
             chat_jid = message.Info.MessageSource.Chat
             client.send_chat_presence(chat_jid, ChatPresence.CHAT_PRESENCE_COMPOSING, ChatPresenceMedia.CHAT_PRESENCE_MEDIA_TEXT)
             
-            response_text = generate_response(history)
+            started = time.time()
+            if STREAM_RESPONSES:
+                response_text = stream_reply(client, message, history, user_name=user_name)
+            else:
+                response_text = generate_response(history, user_name=user_name)
+                send_reply(client, message, response_text)
             
-            # Add to history
-            history.append({"role": "assistant", "content": response_text})
-            if len(history) > MAX_HISTORY:
-                history.pop(0)
-                
-            # Send response using send_message if reply fails or as alternative
-            # Some JIDs (@lid) work better with direct send_message
-            try:
-                # First try reply
-                client.reply_message(response_text, message)
-            except Exception as e:
-                print(f"⚠️ Reply failed, attempting direct send: {e}")
-                client.send_message(to=message.Info.MessageSource.Chat, message=response_text)
+            # Personalized answers (with the customer's name) and errors are not reusable
+            if use_cache and response_text != ERROR_REPLY and not (user_name and user_name in response_text):
+                answer_cache.store(prompt, response_text, prompt_version, generation_seconds=time.time() - started)
+            
+            # Add to memory
+            conversation_memory.add(chat_id, {"role": "assistant", "content": response_text})
             
             print(f"Sent: {response_text[:50]}...")
         
@@ -277,13 +359,15 @@ def handle_message(client: NewClient, message: MessageEv):
             chat_jid = message.Info.MessageSource.Chat
             client.send_chat_presence(chat_jid, ChatPresence.CHAT_PRESENCE_COMPOSING, ChatPresenceMedia.CHAT_PRESENCE_MEDIA_TEXT)
             
-            image_bytes = generate_image(prompt)
-            if image_bytes:
-                chat_jid = message.Info.MessageSource.Chat
-                client.send_image(chat_jid, image_bytes, caption=f"Aqui está sua imagem: {prompt}", quoted=message)
-                print(f"Image sent to {chat_id}")
-            else:
-                client.reply_message("❌ Desculpe, tive um erro ao gerar sua imagem.", message)
+            # Generated in the background so the chat queue is not held for the whole DALL·E call
+            def deliver_image(image_bytes):
+                if image_bytes:
+                    client.send_image(chat_jid, image_bytes, caption=f"Aqui está sua imagem: {prompt}", quoted=message)
+                    print(f"Image sent to {chat_id}")
+                else:
+                    client.reply_message("❌ Desculpe, tive um erro ao gerar sua imagem.", message)
+
+            image_service.request_image(prompt, deliver_image)
         
         # Check for !run script command
         elif text.startswith("!run "):
@@ -336,7 +420,33 @@ def start_whatsapp():
 
     @whatsapp_client.event(MessageEv)
     def on_message(client: NewClient, message: MessageEv):
-        handle_message(client, message)
+        if message.Info.MessageSource.IsFromMe:
+            return
+        chat_id = jid_to_str(message.Info.MessageSource.Chat)
+        try:
+            # Blocks the event thread only while this chat (or the global backlog) is full
+            dispatcher.submit(chat_id, handle_message, client, message)
+        except QueueFull:
+            print(f"⚠️ [MSG] Fila cheia para {chat_id}, mensagem descartada.")
+            try:
+                client.reply_message("⏳ Estou recebendo muitas mensagens agora. Por favor, aguarde um instante e envie novamente.", message)
+            except Exception as e:
+                print(f"Error sending busy reply: {e}")
+
+    @whatsapp_client.event(ConnectedEv)
+    def on_connected(client: NewClient, event: ConnectedEv):
+        print("✅ WhatsApp conectado.")
+        outbox.set_connected(True)
+
+    @whatsapp_client.event(DisconnectedEv)
+    def on_disconnected(client: NewClient, event: DisconnectedEv):
+        print("⚠️ WhatsApp desconectado, mensagens de saída ficarão na fila.")
+        outbox.set_connected(False)
+
+    @whatsapp_client.event(LoggedOutEv)
+    def on_logged_out(client: NewClient, event: LoggedOutEv):
+        print("⚠️ WhatsApp deslogado, mensagens de saída ficarão na fila.")
+        outbox.set_connected(False)
 
     print("Scan the QR code to connect...")
     whatsapp_client.connect()
@@ -0,0 +1,80 @@
+import os
+import time
+import shutil
+import threading
+import subprocess
+
+# Optional voice-note pre-processing before Whisper: trims silence, downmixes to mono,
+# resamples to 16 kHz and re-encodes to low-bitrate Opus, all through ffmpeg pipes
+# (no temporary files). Whisper works at 16 kHz mono internally, so nothing is lost.
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "1") == "1"
+AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "24k")
+AUDIO_FFMPEG_TIMEOUT = float(os.getenv("AUDIO_FFMPEG_TIMEOUT", "20"))
+
+_SILENCE_FILTER = (
+    "silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.2:"
+    "stop_periods=-1:stop_duration=1:stop_threshold=-50dB"
+)
+
+EXTENSIONS = {
+    "audio/ogg": "ogg", "audio/opus": "ogg", "audio/mpeg": "mp3", "audio/mp3": "mp3",
+    "audio/mp4": "m4a", "audio/aac": "m4a", "audio/x-m4a": "m4a", "audio/wav": "wav",
+    "audio/x-wav": "wav", "audio/webm": "webm", "audio/flac": "flac",
+}
+
+_ffmpeg = shutil.which("ffmpeg")
+_stats_lock = threading.Lock()
+_stats = {"processed": 0, "fallbacks": 0, "bytes_in": 0, "bytes_out": 0, "ffmpeg_seconds": 0.0}
+
+def audio_filename(mimetype=None):
+    """Upload name for the audio; Whisper detects the format from the extension."""
+    base = (mimetype or "audio/ogg").split(";")[0].strip().lower()
+    return f"audio.{EXTENSIONS.get(base, 'ogg')}"
+
+def _record(key, bytes_in, bytes_out, seconds=0.0):
+    with _stats_lock:
+        _stats[key] += 1
+        _stats["bytes_in"] += bytes_in
+        _stats["bytes_out"] += bytes_out
+        _stats["ffmpeg_seconds"] += seconds
+
+def preprocess_audio(audio_bytes, mimetype=None):
+    """
+    Returns (bytes, filename) ready for upload. Falls back to the original audio when
+    pre-processing is disabled, ffmpeg is missing or fails, or the result is not smaller.
+    """
+    original = (audio_bytes, audio_filename(mimetype))
+    if not AUDIO_PREPROCESS or not _ffmpeg:
+        return original
+
+    started = time.monotonic()
+    try:
+        result = subprocess.run(
+            [_ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-af", _SILENCE_FILTER, "-ac", "1", "-ar", "16000",
+             "-c:a", "libopus", "-b:a", AUDIO_BITRATE, "-application", "voip", "-f", "ogg", "pipe:1"],
+            input=audio_bytes, capture_output=True, timeout=AUDIO_FFMPEG_TIMEOUT
+        )
+    except Exception as e:
+        print(f"⚠️ [AUDIO] ffmpeg failed, sending original audio: {e}")
+        _record("fallbacks", len(audio_bytes), len(audio_bytes))
+        return original
+    elapsed = time.monotonic() - started
+
+    processed = result.stdout
+    if result.returncode != 0 or not processed or len(processed) >= len(audio_bytes):
+        if result.returncode != 0:
+            print(f"⚠️ [AUDIO] ffmpeg exited with {result.returncode}: {result.stderr.decode(errors='replace')[:200]}")
+        _record("fallbacks", len(audio_bytes), len(audio_bytes), elapsed)
+        return original
+
+    _record("processed", len(audio_bytes), len(processed), elapsed)
+    print(f"🎧 [AUDIO] {len(audio_bytes)} -> {len(processed)} bytes in {elapsed * 1000:.0f} ms")
+    return processed, "audio.ogg"
+
+def get_audio_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["enabled"] = AUDIO_PREPROCESS and _ffmpeg is not None
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    return stats
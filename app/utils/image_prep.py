@@ -0,0 +1,85 @@
+import io
+import os
+import time
+import threading
+
+# Photos are downscaled to what OpenAI Vision actually looks at before being uploaded:
+# 'high' detail images are fitted in 2048x2048 and then scaled so the short side is 768px,
+# 'low' detail images are seen as a single 512x512 tile (85 tokens).
+IMAGE_DETAIL = os.getenv("IMAGE_DETAIL", "auto")  # low | high | auto
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()  # jpeg | webp
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+LOW_DETAIL_SIDE = 512
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+
+_stats_lock = threading.Lock()
+_stats = {"images": 0, "low_detail": 0, "failures": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+def _target_size(width, height, detail):
+    if detail == "low":
+        scale = min(1.0, LOW_DETAIL_SIDE / max(width, height))
+    else:
+        scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height), HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def prepare_image(image_bytes, detail=None):
+    """
+    Returns (bytes, mimetype, detail) for a Vision call: EXIF orientation applied and
+    metadata stripped, resized to the detail tier and re-encoded as JPEG/WebP.
+    On any failure the original bytes are returned unchanged.
+    """
+    detail = detail or IMAGE_DETAIL
+    started = time.monotonic()
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img = ImageOps.exif_transpose(img)
+            if detail == "auto":
+                # Small pictures gain nothing from the tiled 'high' mode
+                detail = "low" if max(img.size) <= LOW_DETAIL_SIDE else "high"
+
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+
+            size = _target_size(img.width, img.height, detail)
+            if size != img.size:
+                img = img.resize(size, Image.LANCZOS)
+
+            # Saving without exif=... drops EXIF/GPS metadata
+            out = io.BytesIO()
+            if IMAGE_FORMAT == "webp":
+                img.save(out, "WEBP", quality=IMAGE_QUALITY, method=4)
+                mimetype = "image/webp"
+            else:
+                img.save(out, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+                mimetype = "image/jpeg"
+            processed = out.getvalue()
+    except Exception as e:
+        print(f"⚠️ [IMAGE] Pre-processing failed, sending original image: {e}")
+        with _stats_lock:
+            _stats["failures"] += 1
+        return image_bytes, "image/jpeg", detail
+
+    elapsed = time.monotonic() - started
+    with _stats_lock:
+        _stats["images"] += 1
+        _stats["low_detail"] += detail == "low"
+        _stats["bytes_in"] += len(image_bytes)
+        _stats["bytes_out"] += len(processed)
+        _stats["seconds"] += elapsed
+    print(f"🖼️ [IMAGE] {len(image_bytes)} -> {len(processed)} bytes ({size[0]}x{size[1]}, detail {detail}) in {elapsed * 1000:.0f} ms")
+    return processed, mimetype, detail
+
+def get_image_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    return stats
@@ -0,0 +1,98 @@
+import os
+import re
+from functools import lru_cache
+from collections import namedtuple
+
+# One place to turn phone numbers and WhatsApp JIDs into each other, so the database,
+# the flow state and the WhatsApp handlers all key users by the same canonical phone.
+#   "+55 (44) 99984-9929" or "(44) 99984-9929" -> "5544999849929" -> "5544999849929@s.whatsapp.net"
+#   "15551234567@s.whatsapp.net" or "+1 555 123 4567" -> "15551234567" (country code kept as is)
+#   "5544999849929:12@s.whatsapp.net" (device JID) -> "5544999849929"
+#   "123456789@lid" -> "123456789" (LIDs are opaque ids, kept as they are)
+
+USER_SERVER = "s.whatsapp.net"
+LID_SERVER = "lid"
+DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "55")
+JID_CACHE_SIZE = int(os.getenv("JID_CACHE_SIZE", "4096"))
+
+_NON_DIGITS = re.compile(r"\D+")
+
+ParsedJid = namedtuple("ParsedJid", ["user", "server", "device", "raw_agent"])
+
+@lru_cache(maxsize=JID_CACHE_SIZE)
+def parse_jid(value):
+    """Splits "user[.agent][:device]@server" (a bare phone gets the user server)."""
+    value = value.strip()
+    user, _, server = value.partition("@")
+    if not server:
+        return ParsedJid(_NON_DIGITS.sub("", user), USER_SERVER, 0, 0)
+
+    device = raw_agent = 0
+    user, _, device_part = user.partition(":")
+    if device_part.isdigit():
+        device = int(device_part)
+    user, _, agent_part = user.partition(".")
+    if agent_part.isdigit():
+        raw_agent = int(agent_part)
+    return ParsedJid(user, server, device, raw_agent)
+
+@lru_cache(maxsize=JID_CACHE_SIZE)
+def canonical_phone(value, add_country_code=True):
+    """
+    Canonical key for a user: digits only, without server/device suffixes. Only bare local
+    numbers (10-11 digits, DDD + number, no "+" and no "@server") get DEFAULT_COUNTRY_CODE
+    prepended; JID users and "+"-prefixed numbers already carry their country code.
+    Pass add_country_code=False for values that are already canonical keys (the database
+    layer), so "15551234567" is not mistaken for a local number.
+    """
+    parsed = parse_jid(value)
+    if parsed.server == LID_SERVER:
+        return parsed.user
+    digits = _NON_DIGITS.sub("", parsed.user)
+    raw = value.strip()
+    is_local = "@" not in raw and not raw.startswith("+")
+    if add_country_code and DEFAULT_COUNTRY_CODE and is_local and len(digits) in (10, 11):
+        digits = DEFAULT_COUNTRY_CODE + digits
+    return digits
+
+@lru_cache(maxsize=JID_CACHE_SIZE)
+def normalize_jid(value):
+    """"user@server" string for a phone or JID (device suffix dropped)."""
+    parsed = parse_jid(value)
+    return f"{canonical_phone(value)}@{parsed.server}"
+
+@lru_cache(maxsize=JID_CACHE_SIZE)
+def to_jid(value):
+    """
+    Protobuf JID for a phone or JID string, built once per distinct value.
+    The cached object is shared: callers must not modify it.
+    """
+    from neonize.utils.jid import JID
+    parsed = parse_jid(value)
+    return JID(
+        User=canonical_phone(value),
+        Server=parsed.server,
+        RawAgent=0,
+        Device=0,
+        Integrator=0,
+        IsEmpty=False
+    )
+
+def jid_to_str(jid):
+    """
+    Same output as neonize's Jid2String. Not cached: reading the protobuf fields to build
+    a cache key costs as much as formatting, so the common case just reads fewer fields.
+    """
+    if jid.RawAgent or jid.Device:
+        if jid.RawAgent > 0:
+            return f"{jid.User}.{jid.RawAgent}:{jid.Device}@{jid.Server}"
+        return f"{jid.User}:{jid.Device}@{jid.Server}"
+    user = jid.User
+    return f"{user}@{jid.Server}" if user else jid.Server
+
+def get_jid_cache_stats():
+    stats = {}
+    for func in (parse_jid, canonical_phone, normalize_jid, to_jid):
+        info = func.cache_info()
+        stats[func.__name__] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
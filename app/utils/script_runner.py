@@ -1,18 +1,213 @@
 import subprocess
 import os
 import sys
+import json
+import time
+import select
+import threading
+
+SCRIPT_TIMEOUT = 30  # seconds
+POOL_SIZE = int(os.getenv("SCRIPT_POOL_SIZE", "2"))
+MAX_JOBS_PER_WORKER = int(os.getenv("SCRIPT_WORKER_MAX_JOBS", "100"))
+CHECKOUT_TIMEOUT = float(os.getenv("SCRIPT_CHECKOUT_TIMEOUT", "10"))
+# The worker protocol waits on pipes with select(), which Windows only supports for sockets
+USE_WARM_POOL = os.getenv("SCRIPT_WARM_POOL", "1") != "0" and os.name != "nt"
+
+class WorkerError(Exception):
+    """The worker process died or answered with something unreadable."""
+
+class ScriptWorker:
+    """One pre-warmed python process running app/utils/script_worker.py."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "app.utils.script_worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=os.getcwd(),
+            env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [_project_root(), os.getenv("PYTHONPATH")]))},
+        )
+        self.jobs = 0
+        self._buffer = b""
+
+    def run(self, script_name, args, timeout):
+        request = json.dumps({"script": script_name, "args": args}) + "\n"
+        try:
+            self.process.stdin.write(request.encode("utf-8"))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"worker stdin closed: {e}")
+        self.jobs += 1
+
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(script_name, timeout)
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise WorkerError("worker exited unexpectedly")
+                self._buffer += chunk
+
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise WorkerError(f"invalid worker response: {e}")
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        except Exception:
+            self.process.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+class WarmScriptPool:
+    """
+    Bounded pool of pre-warmed script workers.
+    A worker is killed on timeout and recycled after max_jobs runs.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_jobs=MAX_JOBS_PER_WORKER):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle = []
+        self._count = 0
+        self._cond = threading.Condition()
+        self._stats = {"runs": 0, "timeouts": 0, "worker_errors": 0, "workers_started": 0, "workers_recycled": 0}
+
+    def _checkout(self, timeout=CHECKOUT_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        return worker
+                    self._count -= 1
+                if self._count < self.size:
+                    self._count += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WorkerError(f"no script worker available within {timeout}s")
+                self._cond.wait(remaining)
+        try:
+            worker = ScriptWorker()
+        except Exception:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["workers_started"] += 1
+        return worker
+
+    def _checkin(self, worker, discard=False):
+        with self._cond:
+            if discard or not worker.alive() or worker.jobs >= self.max_jobs:
+                self._count -= 1
+                if not discard and worker.jobs >= self.max_jobs:
+                    self._stats["workers_recycled"] += 1
+                    worker.stop()
+            else:
+                self._idle.append(worker)
+            self._cond.notify()
+
+    def warm_up(self):
+        """Starts all workers ahead of the first request."""
+        workers = []
+        for _ in range(self.size):
+            with self._cond:
+                if self._count >= self.size:
+                    break
+            workers.append(self._checkout())
+        for worker in workers:
+            self._checkin(worker)
+
+    def run(self, script_name, args, timeout=SCRIPT_TIMEOUT):
+        worker = self._checkout()
+        try:
+            result = worker.run(script_name, args, timeout)
+        except BaseException as e:
+            # Whatever went wrong, the worker's state is unknown: kill it and free its slot
+            try:
+                worker.kill()
+            except Exception:
+                pass
+            self._checkin(worker, discard=True)
+            with self._cond:
+                self._stats["timeouts" if isinstance(e, subprocess.TimeoutExpired) else "worker_errors"] += 1
+            if isinstance(e, Exception) and not isinstance(e, (subprocess.TimeoutExpired, WorkerError)):
+                raise WorkerError(f"{type(e).__name__}: {e}") from e
+            raise
+        self._checkin(worker)
+        with self._cond:
+            self._stats["runs"] += 1
+        return result
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({"size": self._count, "idle": len(self._idle), "max": self.size})
+        return stats
+
+    def shutdown(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+        for worker in idle:
+            worker.stop()
+
+_pool = WarmScriptPool()
+
+def _project_root():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def warm_up():
+    """Pre-starts the script workers (called at application startup)."""
+    if USE_WARM_POOL:
+        _pool.warm_up()
+
+def shutdown():
+    _pool.shutdown()
+
+def get_script_pool_stats():
+    return _pool.stats()
+
+def _run_subprocess(script_path, args):
+    # Use the same python interpreter running the bot
+    cmd = [sys.executable, script_path] + args
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        timeout=SCRIPT_TIMEOUT # Safety timeout
+    )
+    return {"returncode": result.returncode, "stdout": result.stdout, "stderr": result.stderr}
 
 def run_script(script_name, args):
     """
     Executes a python script from the app/scripts directory.
-    
+    Runs on a pre-warmed worker process when possible (falls back to a fresh subprocess).
+
     :param script_name: Name of the script (without .py)
     :param args: List of string arguments
     :return: Output of the script or error message
     """
     scripts_dir = os.path.join(os.getcwd(), "app", "scripts")
     script_path = os.path.join(scripts_dir, f"{script_name}.py")
-    
+
     # Check for case sensitivity (especially on Linux/Railway)
     if not os.path.exists(script_path):
         lower_path = os.path.join(scripts_dir, f"{script_name.lower()}.py")
@@ -21,24 +216,25 @@ def run_script(script_name, args):
         else:
             available = [f.replace(".py", "") for f in os.listdir(scripts_dir) if f.endswith(".py")]
             return f"❌ Erro: O script '{script_name}.py' não foi encontrado.\n\nScripts disponíveis: {', '.join(available)}"
-    
+
+    module_name = os.path.basename(script_path)[:-3]
+
     try:
-        # Use the same python interpreter running the bot
-        cmd = [sys.executable, script_path] + args
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30 # Safety timeout
-        )
-        
-        if result.returncode == 0:
-            return result.stdout.strip()
+        result = None
+        if USE_WARM_POOL:
+            try:
+                result = _pool.run(module_name, args)
+            except WorkerError as e:
+                print(f"⚠️ [SCRIPTS] Warm worker failed ({e}), running in a new process...")
+        if result is None:
+            result = _run_subprocess(script_path, args)
+
+        if result["returncode"] == 0:
+            return result["stdout"].strip()
         else:
-            return f"⚠️ Erro na execução:\n{result.stderr.strip()}"
-            
+            return f"⚠️ Erro na execução:\n{result['stderr'].strip()}"
+
     except subprocess.TimeoutExpired:
-        return "🛑 Erro: O script demorou muito para responder (timeout de 30s)."
+        return f"🛑 Erro: O script demorou muito para responder (timeout de {SCRIPT_TIMEOUT}s)."
     except Exception as e:
         return f"🔥 Erro interno ao rodar o script: {str(e)}"
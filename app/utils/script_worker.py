@@ -0,0 +1,79 @@
+"""
+Long-lived worker process used by app.utils.script_runner.
+
+Imports every script in app/scripts once at startup (so pandas & co. are already loaded),
+then serves requests read from stdin, one JSON object per line:
+    {"script": "hello", "args": ["Maria"]}
+and answers each with one JSON line:
+    {"returncode": 0, "stdout": "...", "stderr": "..."}
+"""
+import os
+import sys
+import io
+import json
+import runpy
+import importlib
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+SCRIPTS_DIR = os.path.join(project_root, "app", "scripts")
+
+def warm_up():
+    """Imports all scripts so the first request does not pay for their imports."""
+    for file_name in sorted(os.listdir(SCRIPTS_DIR)):
+        if file_name.endswith(".py"):
+            try:
+                importlib.import_module(f"app.scripts.{file_name[:-3]}")
+            except Exception as e:
+                print(f"⚠️ [SCRIPTS] Could not preload {file_name}: {e}", file=sys.stderr)
+
+def run(script, args):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    script_path = os.path.join(SCRIPTS_DIR, f"{script}.py")
+    old_argv = sys.argv
+    sys.argv = [script_path] + list(args)
+    returncode = 0
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            module = importlib.import_module(f"app.scripts.{script}")
+            if callable(getattr(module, "main", None)):
+                module.main()
+            else:
+                # Scripts without main() still work, their imports are already cached
+                runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            returncode = e.code
+        elif e.code is not None:
+            stderr.write(str(e.code))
+            returncode = 1
+    except BaseException:
+        traceback.print_exc(file=stderr)
+        returncode = 1
+    finally:
+        sys.argv = old_argv
+    return {"returncode": returncode, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+def serve():
+    # Keep the protocol on a private copy of stdout; anything written straight to fd 1
+    # (child processes, C extensions) goes to stderr instead of corrupting the replies.
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    warm_up()
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            response = run(request["script"], request.get("args", []))
+        except Exception as e:
+            response = {"returncode": 1, "stdout": "", "stderr": f"Invalid request: {e}"}
+        protocol.write(json.dumps(response, ensure_ascii=False) + "\n")
+        protocol.flush()
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,63 @@
+import time
+import threading
+import traceback
+from contextlib import contextmanager
+
+# Startup-phase timing. Import this module first so "since_boot" covers the whole boot.
+
+_boot = time.perf_counter()
+_phases = []  # dicts: name, seconds, status, thread, started_at
+_lock = threading.Lock()
+
+@contextmanager
+def phase(name):
+    """Times a startup phase and records it in the report (errors are recorded and re-raised)."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException as e:
+        status = f"error: {type(e).__name__}: {e}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _phases.append({
+                "name": name,
+                "seconds": round(elapsed, 4),
+                "started_at": round(started - _boot, 4),
+                "thread": threading.current_thread().name,
+                "status": status,
+            })
+        print(f"⏱️ [STARTUP] {name}: {elapsed * 1000:.0f} ms ({status})")
+
+def run_in_background(name, func, *args):
+    """Runs func in a daemon thread as a timed phase (for work that must not delay serving)."""
+    def target():
+        try:
+            with phase(name):
+                func(*args)
+        except Exception:
+            traceback.print_exc()
+
+    thread = threading.Thread(target=target, name=f"startup-{name}", daemon=True)
+    thread.start()
+    return thread
+
+def mark_ready():
+    """Records the moment the app is able to serve requests."""
+    with _lock:
+        _phases.append({
+            "name": "ready",
+            "seconds": 0.0,
+            "started_at": round(time.perf_counter() - _boot, 4),
+            "thread": threading.current_thread().name,
+            "status": "ok",
+        })
+    print(f"🚀 [STARTUP] Ready to serve after {time.perf_counter() - _boot:.2f}s")
+
+def report():
+    """Startup phases in the order they finished, plus time since boot."""
+    with _lock:
+        phases = list(_phases)
+    return {"since_boot": round(time.perf_counter() - _boot, 4), "phases": phases}
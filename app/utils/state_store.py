@@ -0,0 +1,135 @@
+import atexit
+import copy
+import json
+import os
+import threading
+
+class StateStore:
+    """
+    In-memory key/value store persisted as a JSON snapshot plus an append-only journal.
+
+    Reads are served from memory. Each write appends one JSON line to ``<path>.journal``;
+    the journal is periodically compacted into a new snapshot written to a temporary file
+    and atomically renamed over ``path``. Replaying the journal is idempotent, so a crash
+    between the rename and the journal truncation loses nothing.
+    """
+
+    def __init__(self, path, compact_every=500, compact_interval=60.0, fsync=False):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self._data = {}
+        self._lock = threading.RLock()
+        self._journal_entries = 0
+        self._stop = threading.Event()
+
+        self._load()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if self._journal_entries:
+            self.compact()
+
+        if compact_interval:
+            thread = threading.Thread(target=self._compact_loop, args=(compact_interval,), name="state-store-compactor", daemon=True)
+            thread.start()
+        atexit.register(self.close)
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except Exception as e:
+                print(f"⚠️ [STATE] Could not read snapshot {self.path}: {e}")
+                self._data = {}
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash, ignore the partial line
+                        continue
+                    if entry.get("op") == "set":
+                        self._data[entry["key"]] = entry["value"]
+                    elif entry.get("op") == "del":
+                        self._data.pop(entry["key"], None)
+                    self._journal_entries += 1
+
+    def _append(self, entry):
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_entries += 1
+        if self._journal_entries >= self.compact_every:
+            self.compact()
+
+    def get(self, key, default=None):
+        """Returns a copy of the stored value (never touches the disk)."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            return copy.deepcopy(self._data[key])
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = copy.deepcopy(value)
+            self._append({"op": "set", "key": key, "value": value})
+
+    def update(self, key, func, default=None):
+        """Atomically replaces the value of key with func(current_value_copy)."""
+        with self._lock:
+            value = func(self.get(key, default))
+            self.set(key, value)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self._append({"op": "del", "key": key})
+
+    def items(self):
+        with self._lock:
+            return copy.deepcopy(list(self._data.items()))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def compact(self):
+        """Writes a fresh snapshot (rename-on-write) and truncates the journal."""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            self._journal.close()
+            self._journal = open(self.journal_path, "w", encoding="utf-8")
+            self._journal_entries = 0
+
+    def _compact_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                with self._lock:
+                    if self._journal_entries:
+                        self.compact()
+            except Exception as e:
+                print(f"⚠️ [STATE] Compaction failed for {self.path}: {e}")
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._journal.closed:
+                return
+            try:
+                if self._journal_entries:
+                    self.compact()
+            finally:
+                self._journal.close()
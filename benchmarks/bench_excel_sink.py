@@ -0,0 +1,70 @@
+"""
+Throughput benchmark for the Excel sink (app/services/excel_service.py).
+
+Measures the cost of one submission (ExcelSink.append) and of one batch roll as the
+workbook grows, next to the legacy "read whole workbook, add a row, rewrite it" approach.
+
+Usage: python benchmarks/bench_excel_sink.py [max_rows] [step]
+"""
+import os
+import sys
+import time
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from openpyxl import load_workbook
+from app.services.excel_service import ExcelSink
+
+SAMPLE_ROW = {
+    "Pessoa": "Física", "Nome": "Maria", "Sobrenome": "Silva", "Email": "maria@example.com",
+    "Data Nascimento": "1990-01-01", "Genero": "Feminino", "Cpf/Cnpj": "00000000000",
+    "Telefone": "5544999999999", "CEP": "87000000", "Rua/Av": "Av. Brasil", "Numero": "100",
+    "Bairro": "Centro", "Cidade": "Maringá", "UF": "PR",
+}
+
+def legacy_append(path, row):
+    """The old approach: O(total rows) per submission."""
+    workbook = load_workbook(path)
+    workbook.active.append(list(row.values()))
+    workbook.save(path)
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    step = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    batch = 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.xlsx")
+        sink = ExcelSink(path, roll_every=batch, roll_interval=3600)
+
+        print(f"{'rows':>8} {'append (ms)':>12} {'roll/row (ms)':>14} {'legacy (ms)':>12}")
+        rows = 0
+        while rows < max_rows:
+            # Grow the workbook to the next size
+            for _ in range(step - batch):
+                sink.append(SAMPLE_ROW)
+            sink.roll()
+            rows += step - batch
+
+            started = time.perf_counter()
+            for _ in range(batch - 1):
+                sink.append(SAMPLE_ROW)
+            append_ms = (time.perf_counter() - started) * 1000 / (batch - 1)
+
+            started = time.perf_counter()
+            sink.append(SAMPLE_ROW)  # reaches roll_every: rolls the whole batch
+            roll_ms = (time.perf_counter() - started) * 1000 / batch
+            rows += batch
+
+            started = time.perf_counter()
+            legacy_append(path, SAMPLE_ROW)
+            legacy_ms = (time.perf_counter() - started) * 1000
+            rows += 1
+
+            print(f"{rows:>8} {append_ms:>12.3f} {roll_ms:>14.3f} {legacy_ms:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Microbenchmark for the JID helpers (app/utils/jid.py).
+
+Compares the ad-hoc parsing previously done in whatsapp_service/flow_service (string
+splitting, replace("+", ""), a new protobuf JID per send, neonize's Jid2String) with
+the cached helpers, over a realistic mix where a few hundred chats send many messages.
+
+Usage: python benchmarks/bench_jid.py [iterations] [distinct_chats]
+"""
+import os
+import sys
+import time
+import random
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from neonize.utils.jid import Jid2String, JID
+from app.utils.jid import canonical_phone, to_jid, jid_to_str, get_jid_cache_stats
+
+def legacy_phone(chat_id):
+    return chat_id.split("@")[0] if "@" in chat_id else chat_id
+
+def legacy_jid(jid_str):
+    if "@" not in jid_str:
+        jid_str = jid_str.strip().replace("+", "").replace(" ", "")
+        jid_str = f"{jid_str}@s.whatsapp.net"
+    user_part, server_part = jid_str.split("@")
+    return JID(User=user_part, Server=server_part, RawAgent=0, Device=0, Integrator=0, IsEmpty=False)
+
+def timed(label, func, inputs):
+    started = time.perf_counter()
+    for value in inputs:
+        func(value)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed * 1e9 / len(inputs):>10.0f} ns/op")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    random.seed(42)
+    phones = [f"55{random.randint(11, 99)}9{random.randint(10000000, 99999999)}" for _ in range(distinct)]
+    chat_ids = [f"{random.choice(phones)}@s.whatsapp.net" for _ in range(iterations)]
+    form_phones = [f"+{p[:2]} {p[2:4]} {p[4:]}" for p in (random.choice(phones) for _ in range(iterations))]
+    jids = [JID(User=p, Server="s.whatsapp.net", RawAgent=0, Device=0, Integrator=0, IsEmpty=False)
+            for p in (random.choice(phones) for _ in range(iterations))]
+
+    print(f"{iterations} operations over {distinct} distinct chats\n")
+    timed("chat_id -> phone (split)", legacy_phone, chat_ids)
+    timed("chat_id -> phone (canonical_phone)", canonical_phone, chat_ids)
+    timed("form phone -> JID (legacy)", legacy_jid, form_phones)
+    timed("form phone -> JID (to_jid)", to_jid, form_phones)
+    timed("JID -> str (Jid2String)", Jid2String, jids)
+    timed("JID -> str (jid_to_str)", jid_to_str, jids)
+    print(f"\ncache: {get_jid_cache_stats()}")
+
+if __name__ == "__main__":
+    main()